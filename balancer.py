@@ -0,0 +1,283 @@
+"""Package private client side load balancing across several SuperSQL coordinators. Do not use
+directly.
+
+Each coordinator keeps its own pool of idle JDBC connections. New connections are placed on the
+coordinator with the fewest outstanding queries, or the lowest EWMA latency, among the healthy ones.
+Coordinators that fail to connect are ejected for a while and then reprobed by a single connection
+attempt in a background thread, so that queries do not wait on a coordinator that may still be down.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from builtins import object
+from PySupersql import exc
+import collections
+import contextlib
+import logging
+import random
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+LEAST_OUTSTANDING = 'least_outstanding'
+EWMA = 'ewma'
+
+
+class Coordinator(object):
+    """Load and health bookkeeping for one coordinator. Guarded by the owning set's lock."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        # Queries currently running on connections placed on this coordinator
+        self.outstanding = 0
+        # Connections currently handed out from this coordinator
+        self.leased = 0
+        # Exponentially weighted moving average of query latency in seconds, None until measured
+        self.latency = None
+        self.ejected_until = None
+        self.ejections = 0
+        self.idle = collections.deque()
+
+    @property
+    def healthy(self):
+        return self.ejected_until is None
+
+    def __repr__(self):
+        return 'Coordinator({}:{})'.format(self.host, self.port)
+
+
+class CoordinatorSet(object):
+    """Places JDBC connections on a set of coordinators.
+
+    :param addresses: list of ``(host, port)`` tuples
+    :param connect: function taking ``(host, port)`` and returning a new JDBC connection
+    :param policy: ``'least_outstanding'`` or ``'ewma'``
+    :param eject_seconds: float -- how long a failed coordinator is left alone before it is
+        reprobed; doubles with every consecutive failure up to ``max_eject_seconds``
+    :param max_idle: int -- idle connections kept per coordinator
+    :param decay: float -- weight of the newest sample in the EWMA latency
+    """
+
+    # Seconds isValid may take when reusing an idle connection
+    _VALID_TIMEOUT = 1
+
+    def __init__(self, addresses, connect, policy=LEAST_OUTSTANDING, eject_seconds=5,
+                 max_eject_seconds=300, max_idle=8, decay=0.3):
+        if policy not in (LEAST_OUTSTANDING, EWMA):
+            raise exc.ProgrammingError("Unknown load balancing policy {}".format(policy))
+        self.coordinators = [Coordinator(host, port) for host, port in addresses]
+        self._connect = connect
+        self._policy = policy
+        self._eject_seconds = eject_seconds
+        self._max_eject_seconds = max_eject_seconds
+        self._max_idle = max_idle
+        self._decay = decay
+        self._lock = threading.Lock()
+
+    def _score(self, coordinator):
+        if self._policy == EWMA:
+            # Expected wait for one more query, trying unmeasured coordinators first
+            primary = (coordinator.latency or 0) * (coordinator.outstanding + 1)
+        else:
+            primary = coordinator.outstanding
+        return (primary, coordinator.leased, random.random())
+
+    def _candidates(self):
+        """Return the coordinators worth trying, best first, and the ejected ones due for a
+        reprobe. Must hold the lock.
+        """
+        healthy = sorted((c for c in self.coordinators if c.healthy), key=self._score)
+        if not healthy:
+            # Everything is ejected: better to try the one that has been out the longest than fail
+            return sorted(self.coordinators, key=lambda c: c.ejected_until), []
+        now = time.time()
+        due = [c for c in self.coordinators if not c.healthy and c.ejected_until <= now]
+        for coordinator in due:
+            # Let only one probe run until the attempt succeeds or fails
+            coordinator.ejected_until = now + self._eject_seconds
+        return healthy, due
+
+    def _reprobe(self, coordinator):
+        """Try to connect to an ejected coordinator, putting it back in rotation with the new
+        connection in its idle pool if that works
+        """
+        try:
+            connection = self._connect(coordinator.host, coordinator.port)
+        except Exception:
+            _logger.warning("Failed to reconnect to %r", coordinator, exc_info=True)
+            self.eject(coordinator)
+            return
+        _logger.info("%r is healthy again", coordinator)
+        with self._lock:
+            coordinator.ejected_until = None
+            coordinator.ejections = 0
+            if len(coordinator.idle) < self._max_idle:
+                coordinator.idle.append(connection)
+                return
+        _close_quietly(connection)
+
+    def acquire(self):
+        """Place a connection on the best coordinator.
+
+        :returns: tuple of (:py:class:`Coordinator`, JDBC connection)
+        :raises: ``OperationalError`` when no coordinator accepts a connection
+        """
+        with self._lock:
+            candidates, due = self._candidates()
+        for coordinator in due:
+            thread = threading.Thread(target=self._reprobe, args=(coordinator,),
+                                      name='supersql-reprobe')
+            thread.daemon = True
+            thread.start()
+        errors = []
+        for coordinator in candidates:
+            connection = self._take_idle(coordinator)
+            if connection is None:
+                try:
+                    connection = self._connect(coordinator.host, coordinator.port)
+                except Exception as e:
+                    _logger.warning("Failed to connect to %r", coordinator, exc_info=True)
+                    self.eject(coordinator)
+                    errors.append(e)
+                    continue
+            with self._lock:
+                coordinator.leased += 1
+                if not coordinator.healthy:
+                    _logger.info("%r is healthy again", coordinator)
+                    coordinator.ejected_until = None
+                    coordinator.ejections = 0
+            return coordinator, connection
+        raise exc.OperationalError("Could not connect to any coordinator", errors)
+
+    def _take_idle(self, coordinator):
+        while True:
+            with self._lock:
+                if not coordinator.idle:
+                    return None
+                connection = coordinator.idle.pop()
+            try:
+                if connection.isValid(self._VALID_TIMEOUT):
+                    return connection
+            except Exception:
+                pass
+            _close_quietly(connection)
+
+    def release(self, coordinator, connection):
+        """Return a connection obtained from :py:meth:`acquire` to its coordinator's pool"""
+        with self._lock:
+            coordinator.leased -= 1
+            if coordinator.healthy and len(coordinator.idle) < self._max_idle:
+                coordinator.idle.append(connection)
+                return
+        _close_quietly(connection)
+
+    def discard(self, coordinator, connection):
+        """Close a connection obtained from :py:meth:`acquire` instead of pooling it"""
+        with self._lock:
+            coordinator.leased -= 1
+        _close_quietly(connection)
+
+    def eject(self, coordinator):
+        """Stop placing connections on ``coordinator`` until it is reprobed"""
+        with self._lock:
+            coordinator.ejections += 1
+            backoff = min(self._eject_seconds * 2 ** (coordinator.ejections - 1),
+                          self._max_eject_seconds)
+            coordinator.ejected_until = time.time() + backoff
+            idle = list(coordinator.idle)
+            coordinator.idle.clear()
+        _logger.warning("Ejected %r for %.0f seconds", coordinator, backoff)
+        for connection in idle:
+            _close_quietly(connection)
+
+    @contextlib.contextmanager
+    def track(self, coordinator):
+        """Context manager recording one query on ``coordinator``: it counts as outstanding while
+        running, its latency feeds the EWMA and connection errors eject the coordinator.
+        """
+        with self._lock:
+            coordinator.outstanding += 1
+        start = time.time()
+        try:
+            yield
+        except Exception as e:
+            if _is_connection_error(e):
+                self.eject(coordinator)
+            raise
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                coordinator.outstanding -= 1
+                if coordinator.latency is None:
+                    coordinator.latency = elapsed
+                else:
+                    coordinator.latency += self._decay * (elapsed - coordinator.latency)
+
+    def stats(self):
+        """Return a snapshot of each coordinator's load and health"""
+        with self._lock:
+            return [{
+                'host': c.host,
+                'port': c.port,
+                'outstanding': c.outstanding,
+                'leased': c.leased,
+                'idle': len(c.idle),
+                'latency': c.latency,
+                'healthy': c.healthy,
+            } for c in self.coordinators]
+
+
+def _is_connection_error(e):
+    """Whether ``e`` means the coordinator is unreachable rather than the query being bad"""
+    if isinstance(e, exc.OperationalError):
+        return True
+    get_sql_state = getattr(e, 'getSQLState', None)
+    try:
+        sql_state = get_sql_state() if get_sql_state is not None else None
+    except Exception:
+        return False
+    # SQLSTATE class 08 is "connection exception"
+    return bool(sql_state) and str(sql_state).startswith('08')
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        _logger.debug("Failed to close connection", exc_info=True)
+
+
+_coordinator_sets = {}
+_coordinator_sets_lock = threading.Lock()
+
+
+def get_coordinator_set(addresses, connect, policy=LEAST_OUTSTANDING):
+    """Return the process wide :py:class:`CoordinatorSet` for these coordinators, so that every
+    connection to them shares the same load, health and idle pools.
+    """
+    key = (tuple(addresses), policy)
+    with _coordinator_sets_lock:
+        if key not in _coordinator_sets:
+            _coordinator_sets[key] = CoordinatorSet(addresses, connect, policy)
+        return _coordinator_sets[key]
+
+
+def parse_addresses(hosts, default_port):
+    """Parse ``'a,b:7912'`` or ``['a', 'b:7912']`` into ``[('a', default_port), ('b', 7912)]``"""
+    if isinstance(hosts, (list, tuple)):
+        entries = hosts
+    else:
+        entries = hosts.split(',')
+    addresses = []
+    for entry in entries:
+        if isinstance(entry, (list, tuple)):
+            host, port = entry
+        else:
+            entry = entry.strip()
+            if not entry:
+                continue
+            host, _, port = entry.partition(':')
+        addresses.append((host, int(port or default_port)))
+    return addresses
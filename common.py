@@ -10,10 +10,13 @@ from builtins import int
 from builtins import object
 from builtins import range
 from past.builtins import basestring
-from pyhive import exc
+from PySupersql import exc
 import abc
 import collections
+import copy
+import threading
 import time
+from future.utils import raise_from
 from future.utils import with_metaclass
 
 
@@ -24,6 +27,9 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
     _STATE_RUNNING = 1
     _STATE_FINISHED = 2
 
+    # First wait between polls; waits double up to poll_interval
+    _MIN_POLL_INTERVAL = 0.001
+
     def __init__(self, poll_interval=1):
         self._poll_interval = poll_interval
         self._reset_state()
@@ -38,12 +44,33 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         self._state = self._STATE_NONE
         self._data = collections.deque()
         self._columns = None
+        self._wait_time = 0.0
 
     def _fetch_while(self, fn):
+        delay = self._MIN_POLL_INTERVAL
         while fn():
+            before = (len(self._data), self._state)
             self._fetch_more()
-            if fn():
-                time.sleep(self._poll_interval)
+            if (len(self._data), self._state) != before:
+                # Made progress, so there is nothing to wait for
+                delay = self._MIN_POLL_INTERVAL
+            elif fn():
+                # Nothing arrived yet: back off exponentially, so that quick results are not held
+                # up a whole interval
+                start = time.time()
+                time.sleep(min(delay, self._poll_interval))
+                self._wait_time += time.time() - start
+                delay *= 2
+
+    @property
+    def wait_time(self):
+        """Seconds the current query has spent waiting for results, i.e. sleeping after fetches
+        that returned nothing. Cursors that read results synchronously never wait.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        return self._wait_time
 
     @abc.abstractproperty
     def description(self):
@@ -107,10 +134,7 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
             return None
         else:
             self._rownumber += 1
-            result = collections.deque()
-            result.append(map(tuple, self._data))
-            one_data = result.popleft()
-            return one_data
+            return tuple(self._data.popleft())
 
     def fetchmany(self, size=None):
         """Fetch the next set of rows of a query result, returning a sequence of sequences (e.g. a
@@ -153,10 +177,13 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         # return result
 
         #my impl
-        result = []
-        # for row in self._data:
-        #     result.append(row)
-        result = map(tuple, self._data)
+        if self._state == self._STATE_NONE:
+            raise exc.ProgrammingError("No query yet")
+        # Pull in any rows still on the server, then hand the buffer over in one go
+        self._fetch_while(lambda: self._state != self._STATE_FINISHED)
+        result = list(map(tuple, self._data))
+        self._rownumber += len(result)
+        self._data.clear()
         return result
 
     @property
@@ -259,11 +286,109 @@ class ParamEscaper(object):
             raise exc.ProgrammingError("Unsupported object {}".format(item))
 
 
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Shares one execution among concurrent calls for the same key.
+
+    The first caller for a key runs the function; callers arriving while it runs wait for it and
+    get the same result, or a copy of its exception chained to the original. ``executions`` and
+    ``coalesced`` count the calls that ran and the calls that were answered by another call's
+    execution.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Return ``fn()``, or the result of the call for ``key`` that is already in flight"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                # Raising the leader's exception object again would have each follower append its
+                # traceback to it
+                try:
+                    error = copy.copy(flight.error)
+                except Exception:
+                    error = exc.DatabaseError(
+                        "Shared execution failed: {}".format(flight.error))
+                raise_from(error, flight.error)
+            return flight.result
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            return {'executions': self.executions, 'coalesced': self.coalesced}
+
+
 class UniversalSet(object):
     """set containing everything"""
     def __contains__(self, item):
         return True
 
+# Names of the java.sql.Types codes in JDBC result set metadata, lower case like Presto type names
+_JDBC_TYPE_NAMES = {
+    -16: 'longnvarchar',
+    -15: 'nchar',
+    -9: 'nvarchar',
+    -7: 'bit',
+    -6: 'tinyint',
+    -5: 'bigint',
+    -4: 'longvarbinary',
+    -3: 'varbinary',
+    -2: 'binary',
+    -1: 'longvarchar',
+    0: 'null',
+    1: 'char',
+    2: 'numeric',
+    3: 'decimal',
+    4: 'integer',
+    5: 'smallint',
+    6: 'float',
+    7: 'real',
+    8: 'double',
+    12: 'varchar',
+    16: 'boolean',
+    91: 'date',
+    92: 'time',
+    93: 'timestamp',
+    1111: 'other',
+    2000: 'java_object',
+    2002: 'struct',
+    2003: 'array',
+    2004: 'blob',
+    2005: 'clob',
+    2009: 'sqlxml',
+    2011: 'nclob',
+    2013: 'time_with_timezone',
+    2014: 'timestamp_with_timezone',
+}
+
 _VALUES_TO_NAMES = {
     0: "BOOLEAN_TYPE",
     1: "TINYINT_TYPE",
@@ -40,6 +40,7 @@ setup(
     extras_require={
         "SQLAlchemy": ['sqlalchemy>=0.5.0'],
 	"JPype":['jpype>=0.5.4.2'],
+        "Parquet": ['pyarrow>=0.15.0'],
     },
     tests_require=[
         'mock>=1.0.0',
@@ -7,7 +7,7 @@ which is released under the MIT license.
 
 from __future__ import absolute_import
 from __future__ import unicode_literals
-from distutils.version import StrictVersion
+from PySupersql import balancer
 from PySupersql import supersql
 from PySupersql.common import UniversalSet
 from sqlalchemy import exc
@@ -15,6 +15,7 @@ from sqlalchemy import types
 from sqlalchemy import util
 from sqlalchemy.engine import default
 from sqlalchemy.sql import compiler
+import logging
 import re
 import sqlalchemy
 
@@ -23,6 +24,8 @@ try:
 except ImportError:
     from sqlalchemy.sql.compiler import DefaultCompiler as SQLCompiler
 
+_logger = logging.getLogger(__name__)
+
 
 class SupersqlIdentifierPreparer(compiler.IdentifierPreparer):
     # Just quote everything to make things simpler / easier to upgrade
@@ -42,6 +45,32 @@ _type_map = {
     'timestamp': types.TIMESTAMP,
     'date': types.DATE,
 }
+# Keyed by the type codes in cursor descriptions, see PySupersql.common._JDBC_TYPE_NAMES
+_type_code_map = {
+    'bit': types.Boolean,
+    'boolean': types.Boolean,
+    'tinyint': types.Integer,
+    'smallint': types.Integer,
+    'integer': types.Integer,
+    'bigint': BigInteger,
+    'float': types.Float,
+    'real': types.Float,
+    'double': types.Float,
+    'numeric': types.DECIMAL,
+    'decimal': types.DECIMAL,
+    'char': types.String,
+    'nchar': types.String,
+    'varchar': types.String,
+    'nvarchar': types.String,
+    'longvarchar': types.String,
+    'longnvarchar': types.String,
+    'date': types.DATE,
+    'time': types.TIME,
+    'timestamp': types.TIMESTAMP,
+    'binary': types.BINARY,
+    'varbinary': types.VARBINARY,
+    'longvarbinary': types.LargeBinary,
+}
 
 
 class SupersqlCompiler(SQLCompiler):
@@ -49,11 +78,23 @@ class SupersqlCompiler(SQLCompiler):
         return 'length{}'.format(self.function_argspec(fn, **kw))
 
 
+class SupersqlExecutionContext(default.DefaultExecutionContext):
+    def create_server_side_cursor(self):
+        # Used for execution_options(stream_results=True) and yield_per(): the cursor reads rows
+        # from the JDBC result set as they are fetched instead of buffering them all up front.
+        kwargs = {'stream_results': True}
+        fetch_size = self.execution_options.get('fetch_size')
+        if fetch_size:
+            kwargs['fetch_size'] = fetch_size
+        return self._dbapi_connection.cursor(**kwargs)
+
+
 class SupersqlDialect(default.DefaultDialect):
     name = 'supersql'
     driver = 'jpype'
     preparer = SupersqlIdentifierPreparer
     statement_compiler = SupersqlCompiler
+    execution_ctx_cls = SupersqlExecutionContext
     supports_alter = False
     supports_pk_autoincrement = False
     supports_default_values = False
@@ -63,6 +104,13 @@ class SupersqlDialect(default.DefaultDialect):
     returns_unicode_strings = True
     description_encoding = None
     supports_native_boolean = True
+    supports_server_side_cursors = True
+    # Multi-row VALUES statements are split by the cursor to stay under its size limits
+    supports_multivalues_insert = True
+
+    def __init__(self, server_side_cursors=False, **kwargs):
+        default.DefaultDialect.__init__(self, **kwargs)
+        self.server_side_cursors = server_side_cursors
 
     @classmethod
     def dbapi(cls):
@@ -113,6 +161,34 @@ class SupersqlDialect(default.DefaultDialect):
             else:
                 raise
 
+    def _describe_table_columns(self, connection, table_name, schema):
+        """Get column names and types from the metadata of a prepared ``SELECT *``, which the
+        server answers without reading the table.
+        """
+        full_table = self.identifier_preparer.quote_identifier(table_name)
+        if schema:
+            full_table = self.identifier_preparer.quote_identifier(schema) + '.' + full_table
+        cursor = connection.connection.cursor()
+        try:
+            description = cursor.describe('SELECT * FROM {}'.format(full_table))
+        finally:
+            cursor.close()
+        result = []
+        for col in description:
+            col_name, type_code = col[0], col[1]
+            try:
+                coltype = _type_code_map[type_code]
+            except KeyError:
+                util.warn("Did not recognize type '%s' of column '%s'" % (type_code, col_name))
+                coltype = types.NullType
+            result.append({
+                'name': col_name,
+                'type': coltype,
+                'nullable': True,
+                'default': None,
+            })
+        return result
+
     def has_table(self, connection, table_name, schema=None):
         try:
             self._get_table_columns(connection, table_name, schema)
@@ -121,6 +197,12 @@ class SupersqlDialect(default.DefaultDialect):
             return False
 
     def get_columns(self, connection, table_name, schema=None, **kw):
+        try:
+            return self._describe_table_columns(connection, table_name, schema)
+        except (supersql.DatabaseError, exc.DatabaseError):
+            # Fall back to DESCRIBE, which also reports a missing table as NoSuchTableError
+            _logger.info("Could not describe columns of %s, falling back to DESCRIBE",
+                         table_name, exc_info=True)
         rows = self._get_table_columns(connection, table_name, schema)
 
         # presto impl
@@ -197,6 +279,16 @@ class SupersqlDialect(default.DefaultDialect):
             query += ' FROM ' + self.identifier_preparer.quote_identifier(schema)
         return [row.Table for row in connection.execute(query)]
 
+    def do_ping(self, dbapi_connection):
+        # Connection.isValid() is cheaper than the default SELECT 1 round trip
+        dbapi_connection.ping()
+        return True
+
+    def is_disconnect(self, e, connection, cursor):
+        # ping() raises OperationalError for a connection that is no longer valid, and queries
+        # raise it for SQLExceptions of SQLSTATE class 08 (connection exception)
+        return balancer._is_connection_error(e)
+
     def do_rollback(self, dbapi_connection):
         # No transactions for Presto
         pass
@@ -209,7 +301,13 @@ class SupersqlDialect(default.DefaultDialect):
         # requests gives back Unicode strings
         return True
 
-if StrictVersion(sqlalchemy.__version__) < StrictVersion('0.7.0'):
+
+def _sqlalchemy_version():
+    # Avoid distutils.version, which is slow to import and gone in newer Pythons
+    return tuple(int(part) for part in re.findall(r'\d+', sqlalchemy.__version__)[:2])
+
+
+if _sqlalchemy_version() < (0, 7):
     from pyhive import sqlalchemy_backports
 
     def reflecttable(self, connection, table, include_columns=None, exclude_columns=None):
@@ -8,32 +8,312 @@ Many docstrings in this file are based on the PEP, which is in the public domain
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from TCLIService import ttypes
 from builtins import object
+from past.builtins import basestring
+from PySupersql import balancer
 from PySupersql import common
 from PySupersql.common import DBAPITypeObject
+from PySupersql.common import SingleFlight  # noqa
 # Make all exceptions visible in this module per DB-API
-from pyhive.exc import *  # noqa
+from PySupersql.exc import *  # noqa
+import array
 import base64
-import getpass
+import collections
+import csv
+import functools
+import io
 import logging
-import requests
-import jpype
-
-try:  # Python 3
-    import urllib.parse as urlparse
-except ImportError:  # Python 2
-    import urlparse
+import os
+import re
+import threading
+import time
+from future.utils import raise_from
 
 
 # PEP 249 module globals
 apilevel = '2.0'
-threadsafety = 2  # Threads may share the module and connections.
+# Threads may share the module and connections; JDBC connections are leased to one thread at a time
+threadsafety = 2
 paramstyle = 'pyformat'  # Python extended format codes, e.g. ...WHERE name=%(name)s
 
 _logger = logging.getLogger(__name__)
 _escaper = common.ParamEscaper()
 
+_JDBC_VARCHAR = 12
+# ResultSet getter for each supported java.sql.Types code
+_JDBC_GETTERS = {
+    4: 'getInt',
+    12: 'getString',
+    -5: 'getLong',
+}
+
+# pyarrow type factory for each supported java.sql.Types code, used by Cursor.export
+_ARROW_TYPES = {
+    4: 'int32',
+    12: 'string',
+    -5: 'int64',
+}
+
+# INSERT ... VALUES (...)[, (...)] statements that can be batched into multi-row VALUES statements
+_INSERT_VALUES_RE = re.compile(r'^\s*(INSERT\s.+?\sVALUES\s*)(\(.*\))\s*$', re.IGNORECASE | re.DOTALL)
+_PLACEHOLDER_RE = re.compile(r'%(?:\([^)]*\))?s')
+# Statements whose results can be shared between identical concurrent executions
+_QUERY_RE = re.compile(r'^\s*(SELECT|WITH|SHOW|DESC|DESCRIBE)\b', re.IGNORECASE)
+_STRING_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize_sql(sql):
+    """Collapse whitespace outside string literals, so that formatting does not defeat
+    single-flight sharing
+    """
+    parts = _STRING_LITERAL_RE.split(sql.strip())
+    # Odd parts are the literals
+    return ''.join(part if i % 2 else _WHITESPACE_RE.sub(' ', part) for i, part in enumerate(parts))
+
+
+def _split_values_rows(values):
+    """Split the ``(...), (...)`` part of an INSERT statement into its row tuples.
+
+    Only templates made of placeholders are split; anything with quoted literals returns ``None``
+    so that the statement is sent as is.
+    """
+    rows = []
+    depth = 0
+    start = None
+    for i, char in enumerate(values):
+        if char in '\'"`':
+            return None
+        elif char == '(':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0:
+                rows.append(values[start:i + 1])
+        elif depth == 0 and not (char == ',' or char.isspace()):
+            return None
+    if depth != 0:
+        return None
+    return rows
+
+
+_SUPERSQL_JDBC_JARS = ["/Users/waixingren/software/tencent/uaejdbc/supersql-jdbc/target/uaejdbc-1.0-SNAPSHOT-jar-with-dependencies.jar"]
+_SUPERSQL_JDBC_DRIVER = 'com.tencent.supersql.jdbc.SSqlDriver'
+
+_jvm_lock = threading.Lock()
+_thread_state = threading.local()
+# Whether jpype returns Java strings as Python strings, which is only known when this module
+# started the JVM
+_strings_converted = False
+
+
+def _start_jvm():
+    """Import jpype, start the JVM and load the JDBC driver on first use.
+
+    jpype and the JVM are only needed once a connection is opened, so they are not loaded when this
+    module is imported.
+
+    :returns: the ``jpype`` module
+    """
+    global _strings_converted
+    import jpype
+    with _jvm_lock:
+        if not jpype.isJVMStarted():
+            jvm_path = jpype.getDefaultJVMPath()
+            jvm_cp = "-Djava.class.path={}".format(":".join(_SUPERSQL_JDBC_JARS))
+            try:
+                # Since jpype 0.7 strings are java.lang.String proxies unless asked otherwise,
+                # which cannot be pickled or handed to pyarrow
+                jpype.startJVM(jvm_path, jvm_cp, convertStrings=True)
+            except TypeError:
+                # Older jpype has no such option and always converts
+                jpype.startJVM(jvm_path, jvm_cp)
+            _strings_converted = True
+            _logger.debug('jar loaded and jvm started, begin to load class')
+            jpype.JClass(_SUPERSQL_JDBC_DRIVER)
+            _logger.debug('ssqldriver loaded')
+    return jpype
+
+
+class _JVMAttachment(object):
+    """Kept in thread local storage of a thread that :py:func:`_attach_thread` attached to the JVM.
+    Thread locals are cleared when their thread exits, which detaches it again.
+    """
+
+    def __init__(self, jpype, detach):
+        self._jpype = jpype
+        self._detach = detach
+
+    def __del__(self):
+        if self._detach and self._jpype.isJVMStarted():
+            self._jpype.detachThreadFromJVM()
+
+
+def _attach_thread():
+    """Attach the calling thread to the JVM before its first JDBC call. Threads attached here are
+    detached automatically when they exit.
+
+    jpype releases the GIL while a Java method runs, so attached threads wait on the server
+    concurrently.
+    """
+    if getattr(_thread_state, 'attachment', None) is not None:
+        return
+    jpype = _start_jvm()
+    attached = jpype.isThreadAttachedToJVM()
+    if not attached:
+        jpype.attachThreadToJVM()
+    # Threads that were attached already, such as the one that started the JVM, stay attached
+    _thread_state.attachment = _JVMAttachment(jpype, detach=not attached)
+
+
+def _open_jdbc_connection(host, port):
+    # Coordinators are also reprobed from background threads
+    _attach_thread()
+    jpype = _start_jvm()
+    str1 = 'supersql://' + host + ':' + str(port)
+    hostport = str1[str1.index(':'): str1.__len__()]
+    ssqljdbcurl = "jdbc:ssql" + hostport + "/default"
+    return jpype.java.sql.DriverManager.getConnection(ssqljdbcurl, "", "")
+
+
+def _is_sql_exception(e):
+    """Whether ``e`` is a ``java.sql.SQLException`` raised through jpype"""
+    return callable(getattr(e, 'getSQLState', None))
+
+
+def _jdbc_error(e, prefix=''):
+    """Return the DB-API exception to raise for the ``java.sql.SQLException`` ``e``: an
+    ``OperationalError`` when the connection was lost, else a ``DatabaseError``
+    """
+    error_class = OperationalError if balancer._is_connection_error(e) else DatabaseError
+    return error_class(prefix + _text(e))
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return '{}'.format(value)
+
+
+def _describe(resultSetMetaData):
+    """Build a DB-API description from a JDBC ``ResultSetMetaData``. Type codes are the names
+    of the java.sql.Types codes, or the code itself when it has no name.
+    """
+    description = []
+    columnCount = resultSetMetaData.getColumnCount()
+    for i in range(1,columnCount+1):
+        _type = resultSetMetaData.getColumnType(i)
+        type_code = common._JDBC_TYPE_NAMES.get(_type, _type)
+        description.append((
+            _text(resultSetMetaData.getColumnName(i)), _text(type_code), None, None, None, None, True
+        ))
+    return description
+
+
+class _StringDictionary(object):
+    """Dictionary of the distinct values of one string column of a result set.
+
+    Repeated values share one Python string and get a small integer code, until the column has more
+    than ``max_size`` distinct values; from then on values pass through as they are.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.codes = {}
+        self.values = []
+        self.overflowed = False
+
+    def encode(self, value):
+        """Return the code for ``value``, ``None`` for NULL, or ``value`` itself once the
+        dictionary has overflowed"""
+        if value is None or self.overflowed:
+            return value
+        code = self.codes.get(value)
+        if code is None:
+            if len(self.values) >= self.max_size:
+                _logger.debug("Column has more than %d distinct values, not encoding it",
+                              self.max_size)
+                self.overflowed = True
+                self.codes = {}
+                return value
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def intern(self, value):
+        code = self.encode(value)
+        return self.values[code] if isinstance(code, int) else code
+
+
+def _arrow_array(pyarrow, column, arrow_type):
+    """Convert a column chunk to a pyarrow array, reusing dictionary codes where there are any"""
+    if not pyarrow.types.is_dictionary(arrow_type):
+        return pyarrow.array(column, type=arrow_type)
+    if isinstance(column, _EncodedColumn) and not column.dictionary.overflowed:
+        return pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(column.codes, type=arrow_type.index_type),
+            pyarrow.array(column.dictionary.values, type=arrow_type.value_type))
+    return pyarrow.array(column, type=arrow_type.value_type).dictionary_encode()
+
+
+class _EncodedColumn(object):
+    """A chunk of a dictionary encoded string column: ``codes`` index into
+    ``dictionary.values``, with ``None`` for NULL. Iterating yields the strings.
+    """
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self.codes = []
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        values = self.dictionary.values
+        # Once the dictionary overflowed, later entries hold the strings themselves
+        return (values[code] if isinstance(code, int) else code for code in self.codes)
+
+
+def _interning(getter, dictionary):
+    return lambda i: dictionary.intern(getter(i))
+
+
+def _converting(getter):
+    """Wrap ``ResultSet.getString`` of a JVM started without ``convertStrings`` so that it
+    returns Python strings instead of ``java.lang.String`` proxies
+    """
+    def get(i):
+        value = getter(i)
+        return None if value is None else _text(value)
+    return get
+
+
+def _nullable(getter, wasNull):
+    """Wrap a getter of a primitive type, which returns 0 for SQL NULL, to return ``None``"""
+    def get(i):
+        value = getter(i)
+        return None if wasNull() else value
+    return get
+
+
+def _column_getter(resultSet, column_type):
+    """Return the function reading a column of ``column_type`` from the current row"""
+    getter = getattr(resultSet, _JDBC_GETTERS[column_type])
+    if column_type == _JDBC_VARCHAR:
+        return getter if _strings_converted else _converting(getter)
+    return _nullable(getter, resultSet.wasNull)
+
+
+def _as_bool(value):
+    """Interpret flags that may come from a URL query string"""
+    if isinstance(value, basestring):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
 
 def connect(*args, **kwargs):
     """Constructor for creating a connection to the database. See class :py:class:`Connection` for
@@ -44,47 +324,332 @@ def connect(*args, **kwargs):
     return Connection(*args, **kwargs)
 
 
+class _Slot(object):
+    """One JDBC connection of a :py:class:`Connection`, the coordinator it was placed on and the
+    thread currently leasing it
+    """
+
+    def __init__(self, coordinator, connection):
+        self.coordinator = coordinator
+        self.connection = connection
+        # Thread ident of the lease holder and the number of uses it has not released yet
+        self.holder = None
+        self.pins = 0
+
+
+class _LeasedConnection(object):
+    """Handed to each cursor in place of a JDBC connection.
+
+    Attributes are looked up on a JDBC connection leased from the owning :py:class:`Connection` on
+    first use and held until :py:meth:`release`, which the cursor calls once its statement is
+    closed. Threads sharing a :py:class:`Connection` thus never use a JDBC connection at the same
+    time.
+    """
+
+    def __init__(self, connection):
+        self._owner = connection
+        self._slot = None
+
+    def __getattr__(self, name):
+        if self._slot is None:
+            self._slot = self._owner._pin()
+        return getattr(self._slot.connection, name)
+
+    @property
+    def coordinator(self):
+        if self._slot is None:
+            self._slot = self._owner._pin()
+        return self._slot.coordinator
+
+    def release(self):
+        slot, self._slot = self._slot, None
+        if slot is not None:
+            self._owner._unpin(slot)
+
+
 class Connection(object):
     """Presto does not have a notion of a persistent connection.
 
     Thus, these objects are small stateless factories for cursors, which do all the real work.
+
+    Each thread using the connection is attached to the JVM. Cursors lease a JDBC connection while
+    they have a statement open; cursors of the same thread share one, and the JDBC connections of
+    closed cursors are reused by other threads. At most as many JDBC connections are opened as
+    there are threads using the connection at the same time.
+
+    Besides the cursor options, the following keyword arguments are accepted:
+
+    :param keepalive_interval: float -- if set, check the JDBC connections with ``isValid`` every
+        this many seconds in a background thread and reconnect those that have gone stale
+    :param warm_up: bool -- run :py:meth:`warm_up` once connected
+    :param hosts: several coordinators to balance over, as a list or a comma separated string of
+        ``host`` or ``host:port``; a comma separated ``host`` works too
+    :param balance: ``'least_outstanding'`` (default) or ``'ewma'`` -- how to pick the coordinator
+        when several are given
+    :param single_flight: ``True`` or a :py:class:`SingleFlight` shared by several connections --
+        let concurrent executions of the same query on buffered cursors share one server execution
+        and its result; each cursor still reads the rows independently
     """
 
+    # Seconds isValid may take before the connection is considered dead
+    _VALID_TIMEOUT = 5
+
     def __init__(self, *args, **kwargs):
+        keepalive_interval = kwargs.pop('keepalive_interval', None)
+        warm_up = _as_bool(kwargs.pop('warm_up', False))
+        balance = kwargs.pop('balance', balancer.LEAST_OUTSTANDING)
+        hosts = kwargs.pop('hosts', None) or kwargs.get('host')
+        single_flight = kwargs.pop('single_flight', None)
+        if single_flight is not None and not isinstance(single_flight, SingleFlight):
+            single_flight = SingleFlight() if _as_bool(single_flight) else None
+        self._single_flight = single_flight
         self._args = args
         self._kwargs = kwargs
+        self._connect_lock = threading.Lock()
+        self._keepalive = None
+        # Every open slot, the ones no thread is leasing and the leased ones by thread ident
+        self._slots = []
+        self._free = []
+        self._leases = {}
+        if isinstance(hosts, (list, tuple)) or (isinstance(hosts, basestring) and ',' in hosts):
+            addresses = balancer.parse_addresses(hosts, kwargs.get('port') or 7911)
+            self._coordinators = balancer.get_coordinator_set(
+                addresses, _open_jdbc_connection, balance)
+        else:
+            self._coordinators = None
+        if not args:
+            # Cursors take the host as a required argument even when only hosts was given
+            kwargs.setdefault('host', None)
 
-        import logging, os
-        logging.basicConfig(filename=os.path.join('/Users/waixingren/PycharmProjects/sql', 'log.txt'), level=logging.DEBUG)
-        #/Users/waixingren/PycharmProjects/sql
-        logging.debug('begin to load class')
+        # Connect right away so that connection errors surface here
+        self._unpin(self._pin())
+        if keepalive_interval:
+            self.start_keepalive(float(keepalive_interval))
+        if warm_up:
+            self.warm_up()
 
-        supersqljdbcJars = ["/Users/waixingren/software/tencent/uaejdbc/supersql-jdbc/target/uaejdbc-1.0-SNAPSHOT-jar-with-dependencies.jar"]
-        jvm_path = jpype.getDefaultJVMPath()
-        jvm_cp = "-Djava.class.path={}".format(":".join(supersqljdbcJars))
-        jpype.startJVM(jvm_path, jvm_cp)
-        logging.debug('jar loaed and jvm started, begin to load class')
+    def _open(self):
+        """Open a JDBC connection, placing it on the best coordinator when there are several.
 
-        javaClass = jpype.JClass('com.tencent.supersql.jdbc.SSqlDriver')
-        logging.debug('ssqldriver loaded')
-        str1 = 'supersql://' + self._kwargs.get('host') + ':' + str(self._kwargs.get('port'))
-        hostport = str1[str1.index(':'): str1.__len__()]
-        ssqljdbcurl = "jdbc:ssql" + hostport + "/default"
-        self._connection = jpype.java.sql.DriverManager.getConnection(ssqljdbcurl, "", "")
-        kwargs['connection']=self._connection
+        :returns: tuple of (coordinator or ``None``, JDBC connection)
+        """
+        if self._coordinators is None:
+            connection = _open_jdbc_connection(self._kwargs.get('host'), self._kwargs.get('port'))
+            return None, connection
+        return self._coordinators.acquire()
 
+    def _pin(self):
+        """Lease a JDBC connection to the calling thread, attaching the thread to the JVM.
+
+        A thread that holds a lease already gets the same slot again. Otherwise an idle slot is
+        reused, and a new JDBC connection is only opened when there is none. Every call must be
+        matched by :py:meth:`_unpin`.
+
+        :returns: :py:class:`_Slot`
+        """
+        _attach_thread()
+        ident = threading.current_thread().ident
+        with self._connect_lock:
+            slot = self._leases.get(ident)
+            if slot is None and self._free:
+                slot = self._free.pop()
+            if slot is not None:
+                slot.holder = ident
+                slot.pins += 1
+                self._leases[ident] = slot
+                return slot
+        coordinator, connection = self._open()
+        slot = _Slot(coordinator, connection)
+        with self._connect_lock:
+            slot.holder = ident
+            slot.pins = 1
+            self._slots.append(slot)
+            self._leases[ident] = slot
+        return slot
+
+    def _unpin(self, slot):
+        """Undo one :py:meth:`_pin`, making the slot available to other threads once its holder
+        has released all uses of it
+        """
+        with self._connect_lock:
+            slot.pins -= 1
+            if slot.pins > 0:
+                return
+            if self._leases.get(slot.holder) is slot:
+                del self._leases[slot.holder]
+            slot.holder = None
+            # Slots of a closed connection are gone already
+            if slot in self._slots:
+                self._free.append(slot)
+
+    def _release(self, coordinator, connection, reusable):
+        """Close a JDBC connection, or hand it back to its coordinator's pool if ``reusable``"""
+        if self._coordinators is None:
+            connection.close()
+        elif reusable:
+            self._coordinators.release(coordinator, connection)
+        else:
+            self._coordinators.discard(coordinator, connection)
+
+    def _reconnect(self, slot, stale):
+        with self._connect_lock:
+            # Another thread may have reconnected already
+            if slot.connection is not stale:
+                return
+            _logger.info("Reconnecting stale connection to %s", self._kwargs.get('host'))
+            try:
+                self._release(slot.coordinator, stale, reusable=False)
+            except Exception:
+                _logger.debug("Failed to close stale connection", exc_info=True)
+            slot.coordinator, slot.connection = self._open()
+
+    def _is_valid(self, connection, timeout=None):
+        try:
+            return bool(connection.isValid(timeout or self._VALID_TIMEOUT))
+        except Exception:
+            _logger.debug("isValid failed", exc_info=True)
+            return False
+
+    def is_valid(self, timeout=None):
+        """Return whether the calling thread's JDBC connection is still usable, as reported by
+        ``isValid``.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        slot = self._pin()
+        try:
+            return self._is_valid(slot.connection, timeout)
+        finally:
+            self._unpin(slot)
+
+    def ping(self, reconnect=False):
+        """Check that the connection is alive without running a query.
+
+        :param reconnect: bool -- replace a stale JDBC connection instead of raising
+        :raises: ``OperationalError`` when the connection is stale and ``reconnect`` is false
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        slot = self._pin()
+        try:
+            connection = slot.connection
+            if self._is_valid(connection):
+                return
+            if not reconnect:
+                raise OperationalError("Connection to {} is no longer valid".format(
+                    self._kwargs.get('host')))
+            self._reconnect(slot, connection)
+        finally:
+            self._unpin(slot)
+
+    def warm_up(self):
+        """Run a trivial query so that the driver classes and the server session are loaded before
+        the first real request.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        cursor = self.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def start_keepalive(self, interval=60):
+        """Ping the connection every ``interval`` seconds in a daemon thread, reconnecting when it
+        has gone stale. Does nothing if the keepalive is already running.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        if self._keepalive is not None:
+            return
+        stopped = threading.Event()
+        thread = threading.Thread(target=self._keepalive_loop, args=(interval, stopped),
+                                  name='supersql-keepalive')
+        thread.daemon = True
+        self._keepalive = (thread, stopped)
+        thread.start()
+
+    def stop_keepalive(self):
+        """Stop the thread started by :py:meth:`start_keepalive`"""
+        if self._keepalive is None:
+            return
+        thread, stopped = self._keepalive
+        self._keepalive = None
+        stopped.set()
+        if thread is not threading.current_thread():
+            thread.join()
+
+    def _keepalive_loop(self, interval, stopped):
+        _attach_thread()
+        while not stopped.wait(interval):
+            try:
+                with self._connect_lock:
+                    idle = list(self._free)
+                # Leased connections are in use, so only idle ones are checked, each one taken out
+                # of the free list while it is
+                for slot in idle:
+                    with self._connect_lock:
+                        if slot not in self._free:
+                            continue
+                        self._free.remove(slot)
+                        slot.pins += 1
+                    try:
+                        connection = slot.connection
+                        if not self._is_valid(connection):
+                            self._reconnect(slot, connection)
+                    finally:
+                        self._unpin(slot)
+            except Exception:
+                _logger.warning("Keepalive for %s failed", self._kwargs.get('host'), exc_info=True)
 
     def close(self):
-        # self._connection.close
-        pass
+        self.stop_keepalive()
+        with self._connect_lock:
+            slots = self._slots
+            self._slots = []
+            self._free = []
+            self._leases = {}
+        for slot in slots:
+            self._release(slot.coordinator, slot.connection, reusable=True)
 
     def commit(self):
         """Presto does not support transactions"""
         pass
 
-    def cursor(self):
-        """Return a new :py:class:`Cursor` object using the connection."""
-        return Cursor(*self._args, **self._kwargs)
+    def cursor(self, **kwargs):
+        """Return a new :py:class:`Cursor` object using the connection.
+
+        Keyword arguments override the cursor options given to :py:func:`connect`, e.g.
+        ``cursor(stream_results=True)``.
+        """
+        lease = _LeasedConnection(self)
+        cursor_kwargs = dict(self._kwargs, **kwargs)
+        cursor_kwargs['connection'] = lease
+        cursor = Cursor(*self._args, **cursor_kwargs)
+        cursor._release_connection = lease.release
+        if self._coordinators is not None:
+            cursor._target = tuple((c.host, c.port) for c in self._coordinators.coordinators)
+            cursor._tracker = functools.partial(self._track, lease)
+        cursor._single_flight = self._single_flight
+        return cursor
+
+    @property
+    def single_flight(self):
+        """The :py:class:`SingleFlight` coalescing this connection's queries, if any. Its
+        ``stats()`` report how many executions were coalesced.
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        return self._single_flight
+
+    def _track(self, lease):
+        return self._coordinators.track(lease.coordinator)
 
     def rollback(self):
         raise NotSupportedError("Presto does not have transactions")  # pragma: no cover
@@ -98,18 +663,56 @@ class Cursor(common.DBAPICursor):
     visible by other cursors or connections.
     """
 
-    def __init__(self, host, connection, port='7911', schema='default', poll_interval=1):
+    # Rows read from the JDBC result set per fetch when streaming without an explicit fetch size
+    _DEFAULT_FETCH_SIZE = 1000
+    # Limits for the multi-row INSERT statements built by executemany and multi-VALUES inserts
+    _DEFAULT_MAX_STATEMENT_SIZE = 1024 * 1024
+    _DEFAULT_MAX_INSERT_PARAMETERS = 32767
+    # Distinct values kept per string column with dictionary_encode
+    _DEFAULT_MAX_DICTIONARY_SIZE = 4096
+
+    def __init__(self, host, connection, port='7911', schema='default', poll_interval=1,
+                 fetch_size=None, stream_results=False, max_statement_size=None,
+                 max_insert_parameters=None, dictionary_encode=False, max_dictionary_size=None):
         """
         :param host: hostname to connect to the supersql thrift server e.g. ``supersql.example.com``
         :param port: int -- port, defaults to 7911
+        :param fetch_size: int -- JDBC fetch size hint, also the number of rows read per fetch when
+            streaming
+        :param stream_results: bool -- read rows from the server as they are fetched instead of
+            buffering the whole result set in :py:meth:`execute`
+        :param max_statement_size: int -- maximum size in bytes of a batched INSERT statement,
+            defaults to 1 MiB
+        :param max_insert_parameters: int -- maximum number of values in a batched INSERT
+            statement, defaults to 32767
+        :param dictionary_encode: bool -- keep one Python string per distinct value of each string
+            column, and hand :py:meth:`export` dictionary codes instead of strings
+        :param max_dictionary_size: int -- distinct values per column before a column falls back to
+            plain strings, defaults to 4096
         """
         super(Cursor, self).__init__(poll_interval)
         # Config
         self._host = host
         self._port = port
+        # The server queries run on, replaced by the coordinators for a balanced connection
+        self._target = (host, _text(port))
         self._schema = schema
         self._arraysize = 1
         self._poll_interval = poll_interval
+        self._fetch_size = int(fetch_size) if fetch_size else None
+        self._stream_results = _as_bool(stream_results)
+        self._max_statement_size = int(max_statement_size or self._DEFAULT_MAX_STATEMENT_SIZE)
+        self._max_insert_parameters = int(
+            max_insert_parameters or self._DEFAULT_MAX_INSERT_PARAMETERS)
+        self._dictionary_encode = _as_bool(dictionary_encode)
+        self._max_dictionary_size = int(max_dictionary_size or self._DEFAULT_MAX_DICTIONARY_SIZE)
+        self._statement = None
+        # Context manager factory wrapped around each statement to report load to a balancer
+        self._tracker = None
+        # SingleFlight shared by the connection's cursors, if enabled
+        self._single_flight = None
+        # Called once the cursor no longer needs its JDBC connection, set by Connection.cursor()
+        self._release_connection = None
         self._reset_state()
         self._connection=connection
 
@@ -118,6 +721,33 @@ class Cursor(common.DBAPICursor):
         super(Cursor, self)._reset_state()
         self._nextUri = None
         self._columns = None
+        self._column_getters = None
+        self._row_getters = None
+        self._dictionaries = {}
+        self._rowcount = -1
+        # Description and JDBC column types of a result shared through single-flight, which has no
+        # result set of its own
+        self._shared_description = None
+        self._shared_types = None
+
+    def _close_statement(self):
+        if self._statement is not None:
+            self._statement.close()
+            self._statement = None
+        if self._release_connection is not None:
+            self._release_connection()
+
+    def close(self):
+        """Release the JDBC statement and result set of the current query"""
+        self._close_statement()
+        self._reset_state()
+
+    @property
+    def rowcount(self):
+        """The number of rows changed by the last INSERT or other DML statement, or -1 for
+        queries.
+        """
+        return self._rowcount
 
     @property
     def description(self):
@@ -141,6 +771,8 @@ class Cursor(common.DBAPICursor):
             lambda: self._columns is None and
             self._state not in (self._STATE_NONE, self._STATE_FINISHED)
         )
+        if self._columns is None:
+            return self._shared_description
         # if self._columns is None:
         #     return None
         # return [
@@ -149,44 +781,189 @@ class Cursor(common.DBAPICursor):
         #     for col in self._columns
         # ]
 
-        self._description = []
-        resultSetMetaData = self._columns.getMetaData()
-        columnCount = resultSetMetaData.getColumnCount()
-        from PySupersql.common import _VALUES_TO_NAMES
-        for i in range(1,columnCount+1):
-            _type = resultSetMetaData.getColumnType(i)
-            type_code = _VALUES_TO_NAMES[_type]
-            self._description.append((
-                resultSetMetaData.getColumnName(i).decode('utf-8'), type_code.decode('utf-8'),None, None, None, None, True
-            ))
+        self._description = _describe(self._columns.getMetaData())
         return self._description
 
+    def describe(self, operation, parameters=None):
+        """Return what :py:attr:`description` would be for ``operation`` without running it.
+
+        The statement is only prepared and ``PreparedStatement.getMetaData()`` is read. If the
+        driver cannot describe a prepared statement, the query is wrapped in ``LIMIT 0`` instead, so
+        no data is scanned either way. The cursor's current result set is left untouched.
+
+        :raises: ``DatabaseError`` when the server cannot describe the query either way
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        if parameters is None:
+            sql = operation
+        else:
+            sql = operation % _escaper.escape_args(parameters)
+
+        try:
+            self._connection.setSchema('default')
+            try:
+                statement = self._connection.prepareStatement(sql)
+                try:
+                    resultSetMetaData = statement.getMetaData()
+                    if resultSetMetaData is not None:
+                        return _describe(resultSetMetaData)
+                finally:
+                    statement.close()
+            except Exception as e:
+                # Typically SQLFeatureNotSupportedException
+                if not _is_sql_exception(e):
+                    raise
+                _logger.debug("Could not describe prepared statement, falling back to LIMIT 0",
+                              exc_info=True)
+
+            try:
+                statement = self._connection.createStatement()
+                try:
+                    resultset = statement.executeQuery(
+                        'SELECT * FROM ({}) describe_query LIMIT 0'.format(sql))
+                    return _describe(resultset.getMetaData())
+                finally:
+                    statement.close()
+            except Exception as e:
+                if not _is_sql_exception(e):
+                    raise
+                raise_from(_jdbc_error(e, "Could not describe query: "), e)
+        finally:
+            # Keep the JDBC connection only while a statement of the cursor's own is open
+            if self._statement is None and self._release_connection is not None:
+                self._release_connection()
+
     def execute(self, operation, parameters=None):
 
 
+        # Multi-row INSERT ... VALUES may be too large for one statement
+        if isinstance(parameters, dict):
+            match = _INSERT_VALUES_RE.match(operation)
+            rows = match and _split_values_rows(match.group(2))
+            if rows and len(rows) > 1:
+                escaped = _escaper.escape_args(parameters)
+                self._execute_insert(match.group(1), [row % escaped for row in rows],
+                                     len(_PLACEHOLDER_RE.findall(rows[0])))
+                return
+
         # Prepare statement
         if parameters is None:
             sql = operation
         else:
             sql = operation % _escaper.escape_args(parameters)
+        if self._single_flight is not None and not self._stream_results and _QUERY_RE.match(sql):
+            start = time.time()
+            executed = []
+
+            def execute_shared():
+                executed.append(True)
+                return self._execute_shared(sql)
+            # A SingleFlight may be shared by connections to different servers
+            key = (self._target, self._schema, _normalize_sql(sql))
+            self._load_shared(self._single_flight.do(key, execute_shared))
+            if not executed:
+                # Everything up to now was spent waiting for another cursor's execution
+                self._wait_time = time.time() - start
+        else:
+            self._execute_sql(sql)
+
+    def _execute_shared(self, sql):
+        """Run ``sql`` and return its whole result in a form other cursors can load"""
+        self._execute_sql(sql)
+        types = None
+        if self._columns is not None:
+            types = tuple(jdbc_type for _, _, jdbc_type in self._result_columns())
+        result = (self.description, types, tuple(map(tuple, self._data)), self._rowcount)
+        self._close_statement()
+        return result
+
+    def _load_shared(self, result):
+        self._reset_state()
+        self._shared_description, self._shared_types, rows, self._rowcount = result
+        self._data = collections.deque(rows)
+        self._state = self._STATE_FINISHED
 
+    def executemany(self, operation, seq_of_parameters):
+        """Prepare a database operation (query or command) and then execute it against all parameter
+        sequences or mappings found in the sequence ``seq_of_parameters``.
+
+        ``INSERT ... VALUES`` statements are sent as multi-row inserts, split into as few
+        statements as the size and parameter limits allow. Other statements run once per parameter
+        set and only the final result set is retained.
+        """
+        match = _INSERT_VALUES_RE.match(operation)
+        rows = match and _split_values_rows(match.group(2))
+        if not seq_of_parameters or not rows or len(rows) != 1:
+            super(Cursor, self).executemany(operation, seq_of_parameters)
+            return
+        row = rows[0]
+        self._execute_insert(
+            match.group(1),
+            [row % _escaper.escape_args(parameters) for parameters in seq_of_parameters],
+            len(_PLACEHOLDER_RE.findall(row)))
+
+    def _execute_insert(self, prefix, rows, parameters_per_row):
+        """Insert the already formatted ``rows`` with as few ``prefix (...), (...)`` statements as
+        ``max_statement_size`` and ``max_insert_parameters`` allow.
+        """
+        max_rows = max(1, self._max_insert_parameters // max(1, parameters_per_row))
+        prefix_size = len(prefix.encode('utf-8'))
+        rowcount = 0
+        chunk = []
+        size = prefix_size
+        for row in rows:
+            row_size = len(row.encode('utf-8')) + 2  # ', ' separator
+            if chunk and (size + row_size > self._max_statement_size or len(chunk) >= max_rows):
+                self._execute_sql(prefix + ', '.join(chunk))
+                rowcount += max(self._rowcount, 0)
+                chunk = []
+                size = prefix_size
+            chunk.append(row)
+            size += row_size
+        if chunk:
+            self._execute_sql(prefix + ', '.join(chunk))
+            rowcount += max(self._rowcount, 0)
+        self._rowcount = rowcount
+
+    def _execute_sql(self, sql):
+        """Run ``sql`` on a new JDBC statement and start reading its result set, if any"""
+        self._close_statement()
         self._reset_state()
         self._state = self._STATE_RUNNING
+        try:
+            self._execute_statement(sql)
+        except Exception as e:
+            if not _is_sql_exception(e):
+                raise
+            raise_from(_jdbc_error(e), e)
 
+    def _execute_statement(self, sql):
         self._connection.setSchema('default')
-        statement=self._connection.createStatement()
-        if sql.startswith('SELECT'):
-            sql = 'select count(*) as count_1 from kylin_sales'
+        self._statement = self._connection.createStatement()
+        if self._fetch_size:
+            self._statement.setFetchSize(self._fetch_size)
+        if self._tracker is None:
+            has_result_set = self._statement.execute(sql)
         else:
-            sql = 'desc nationhive'
-        resultset = statement.executeQuery(sql)
+            with self._tracker():
+                has_result_set = self._statement.execute(sql)
+        if not has_result_set:
+            self._rowcount = self._statement.getUpdateCount()
+            self._state = self._STATE_FINISHED
+            return
+        resultset = self._statement.getResultSet()
         self._columns = resultset
-        self._process_response()
+        if not self._stream_results:
+            self._process_response()
 
     def poll(self):
-        """Poll for and return the raw status data provided by the Presto REST API.
+        """Poll for the status of the current query.
+
+        Queries run synchronously over JDBC, so there is never any status left to report.
 
-        :returns: dict -- JSON status information or ``None`` if the query is done
+        :returns: ``None`` once the query is done
         :raises: ``ProgrammingError`` when no query has been started
 
         .. note::
@@ -194,23 +971,201 @@ class Cursor(common.DBAPICursor):
         """
         if self._state == self._STATE_NONE:
             raise ProgrammingError("No query yet")
-        if self._nextUri is None:
-            assert self._state == self._STATE_FINISHED, "Should be finished if nextUri is None"
-            return None
-        response = requests.get(self._nextUri)
-        self._process_response(response)
-        return response.json()
+        assert self._nextUri is None, "JDBC queries have no nextUri"
+        return None
+
+    def export(self, path, format='csv', row_group_size=None):
+        """Write the remaining rows of the current query to a file.
+
+        Rows are read from the JDBC result set ``row_group_size`` at a time and written column by
+        column, so memory use stays flat however large the result is. Use a cursor created with
+        ``stream_results=True`` to avoid buffering the result in :py:meth:`execute` first.
+
+        :param path: file to write
+        :param format: ``'csv'`` (with a header row) or ``'parquet'`` (requires ``pyarrow``)
+        :param row_group_size: int -- rows per chunk, and per row group for Parquet; defaults to
+            the cursor's fetch size
+        :returns: dict -- ``{'rows': rows written, 'bytes': size of the file}``
+        :raises: ``ProgrammingError`` when no query with a result set has been run,
+            ``NotSupportedError`` when the result has columns of a type that cannot be converted
+
+        .. note::
+            This is not a part of DB-API.
+        """
+        if self._state == self._STATE_NONE or (
+                self._columns is None and self._shared_types is None):
+            raise ProgrammingError("No query with a result set yet")
+        row_group_size = int(row_group_size or self._fetch_size or self._DEFAULT_FETCH_SIZE)
+        names, types = self._export_columns()
+        if format == 'csv':
+            rows = self._export_csv(path, names, row_group_size)
+        elif format == 'parquet':
+            rows = self._export_parquet(path, names, types, row_group_size)
+        else:
+            raise NotSupportedError("Unsupported export format {}".format(format))
+        written = os.path.getsize(path)
+        _logger.debug("Exported %d rows (%d bytes) to %s", rows, written, path)
+        return {'rows': rows, 'bytes': written}
+
+    def _result_columns(self):
+        """Return ``(index, name, JDBC type)`` for every column of the current result, read from
+        the result set or from the result shared through single-flight
+        """
+        if self._columns is None:
+            return [
+                (i, column[0], jdbc_type) for i, (column, jdbc_type)
+                in enumerate(zip(self._shared_description, self._shared_types), 1)
+            ]
+        resultSetMetaData = self._columns.getMetaData()
+        return [
+            (i, _text(resultSetMetaData.getColumnLabel(i)), resultSetMetaData.getColumnType(i))
+            for i in range(1, resultSetMetaData.getColumnCount() + 1)
+        ]
+
+    def _export_columns(self):
+        """Return the names and JDBC types of the columns to export. Unlike fetching, which skips
+        columns it cannot convert, an export refuses them rather than write a file that silently
+        lacks columns.
+        """
+        columns = self._result_columns()
+        unsupported = [
+            '{} ({})'.format(name, jdbc_type) for _, name, jdbc_type in columns
+            if jdbc_type not in _JDBC_GETTERS
+        ]
+        if unsupported:
+            raise NotSupportedError(
+                "Cannot export columns of unsupported types: {}".format(', '.join(unsupported)))
+        return [name for _, name, _ in columns], [jdbc_type for _, _, jdbc_type in columns]
+
+    def _export_csv(self, path, names, row_group_size):
+        rows = 0
+        with io.open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for columns, count in self._iter_column_chunks(row_group_size):
+                writer.writerows(zip(*columns))
+                rows += count
+        return rows
+
+    def _export_parquet(self, path, names, types, row_group_size):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise NotSupportedError("Parquet export requires pyarrow")
+        arrow_types = [getattr(pyarrow, _ARROW_TYPES[column_type])() for column_type in types]
+        if self._dictionary_encode:
+            arrow_types = [
+                pyarrow.dictionary(pyarrow.int32(), arrow_type) if column_type == _JDBC_VARCHAR
+                else arrow_type
+                for arrow_type, column_type in zip(arrow_types, types)
+            ]
+        schema = pyarrow.schema(list(zip(names, arrow_types)))
+        rows = 0
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+        try:
+            for columns, count in self._iter_column_chunks(row_group_size):
+                arrays = [
+                    _arrow_array(pyarrow, column, field.type)
+                    for column, field in zip(columns, schema)
+                ]
+                writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+                rows += count
+        finally:
+            writer.close()
+        return rows
 
     def _fetch_more(self):
-        """Fetch the next URI and update state"""
-        # self._process_response(requests.get(self._nextUri))
+        """Read the next batch of rows from the JDBC result set and update state"""
+        _attach_thread()
+        self._fetch_rows(self._fetch_size or self._DEFAULT_FETCH_SIZE)
 
+    def _fetch_rows(self, limit=None):
+        """Append up to ``limit`` rows (all remaining rows if ``None``) from the JDBC result set to
+        ``self._data``, marking the query finished once the result set is exhausted.
+        """
         resultSet = self._columns
-        # self._decode_binary(new_data)
-        while resultSet.next():
-            columnName = resultSet.getColumn
-        oneRow = []
-        oneRow.append()
+        getters = self._get_row_getters()
+        fetched = 0
+        while limit is None or fetched < limit:
+            if not resultSet.next():
+                self._state = self._STATE_FINISHED
+                break
+            self._data.append([getter(i) for i, getter in getters])
+            fetched += 1
+
+    def _fetch_columns(self, limit):
+        """Read up to ``limit`` rows from the JDBC result set as one list of values per column,
+        without building Python rows.
+
+        :returns: tuple of (list of columns, number of rows read)
+        """
+        _attach_thread()
+        resultSet = self._columns
+        columns = []
+        appenders = []
+        for i, getter in self._get_column_getters():
+            dictionary = self._dictionaries.get(i)
+            if dictionary is None or dictionary.overflowed:
+                column = []
+                appenders.append((i, getter, column.append))
+            else:
+                column = _EncodedColumn(dictionary)
+                appenders.append((i, lambda i, get=getter, encode=dictionary.encode: encode(get(i)),
+                                  column.codes.append))
+            columns.append(column)
+        fetched = 0
+        while fetched < limit:
+            if not resultSet.next():
+                self._state = self._STATE_FINISHED
+                break
+            for i, getter, append in appenders:
+                append(getter(i))
+            fetched += 1
+        return columns, fetched
+
+    def _get_column_getters(self):
+        """Return ``(index, getter)`` pairs for the result set columns that can be converted"""
+        if self._column_getters is None:
+            resultSet = self._columns
+            resultSetMetaData = resultSet.getMetaData()
+            self._column_getters = [
+                (i, _column_getter(resultSet, resultSetMetaData.getColumnType(i)))
+                for i in range(1, resultSetMetaData.getColumnCount() + 1)
+                if resultSetMetaData.getColumnType(i) in _JDBC_GETTERS
+            ]
+            if self._dictionary_encode:
+                self._dictionaries = {
+                    i: _StringDictionary(self._max_dictionary_size)
+                    for i, _ in self._column_getters
+                    if resultSetMetaData.getColumnType(i) == _JDBC_VARCHAR
+                }
+        return self._column_getters
+
+    def _get_row_getters(self):
+        """Like :py:meth:`_get_column_getters`, with string getters interning their values when
+        dictionary encoding is enabled
+        """
+        if self._row_getters is None:
+            self._row_getters = [
+                (i, _interning(getter, self._dictionaries[i]) if i in self._dictionaries else getter)
+                for i, getter in self._get_column_getters()
+            ]
+        return self._row_getters
+
+    def _iter_column_chunks(self, size):
+        """Yield the remaining rows of the current query as ``(columns, row count)`` chunks of at
+        most ``size`` rows. Rows already buffered by :py:meth:`execute` come first.
+        """
+        while self._data:
+            rows = [self._data.popleft() for _ in range(min(size, len(self._data)))]
+            self._rownumber += len(rows)
+            yield [list(column) for column in zip(*rows)], len(rows)
+        while self._state != self._STATE_FINISHED:
+            columns, fetched = self._fetch_columns(size)
+            self._rownumber += fetched
+            if fetched:
+                yield columns, fetched
 
     def _decode_binary(self, rows):
         # As of Presto 0.69, binary data is returned as the varbinary type in base64 format
@@ -221,9 +1176,7 @@ class Cursor(common.DBAPICursor):
                     row[i] = base64.b64decode(row[i])
 
     def _process_response(self):
-        """Given the JSON response from Presto's REST API, update the internal state with the next
-        URI and any data from the response
-        """
+        """Read the whole JDBC result set into ``self._data`` and mark the query finished"""
         # TODO handle HTTP 503
         # if response.status_code != requests.codes.ok:
         #     fmt = "Unexpected status code {}\n{}"
@@ -251,26 +1204,182 @@ class Cursor(common.DBAPICursor):
         #     raise DatabaseError(response_json['error'])
 
         #process response for supersql
-        resultSet = self._columns
-        resultSetMetaData = resultSet.getMetaData()
-        column_count = resultSetMetaData.getColumnCount()
-        # self._data = []
-        while resultSet.next():
-            one_row = []
-            for i in range(1, column_count+1):
-                column_type = resultSetMetaData.getColumnType(i)
-                if column_type == 4:
-                    column_value = resultSet.getInt(i)
-                    one_row.append(column_value)
-                elif column_type == 12:
-                    column_value = resultSet.getString(i)
-                    one_row.append(column_value)
-                elif column_type == -5:
-                    column_value = resultSet.getLong(i)
-                    one_row.append(column_value)
-            self._data.append(one_row)
+        self._fetch_rows()
+
+    def _fetch_packed(self):
+        """Read the rest of the result set into a :py:class:`QueryResult`, keeping integer columns
+        as arrays and dictionary encoded string columns as codes
+        """
+        if self._columns is None and self._shared_types is None:
+            return QueryResult(self.description, [], 0, self._rowcount)
+        columns = [
+            (i, jdbc_type) for i, _, jdbc_type in self._result_columns()
+            if jdbc_type in _JDBC_GETTERS
+        ]
+        if self._columns is not None:
+            # Set up dictionary encoding before reading any rows
+            self._get_column_getters()
+        indexes = [i for i, _ in columns]
+        packed = []
+        encoded = []
+        for i, column_type in columns:
+            encoded.append(i in self._dictionaries)
+            if column_type in _ARRAY_TYPECODES:
+                packed.append(array.array(_ARRAY_TYPECODES[column_type]))
+            elif i in self._dictionaries:
+                packed.append(array.array('i'))
+            else:
+                packed.append([])
+        rows = 0
+        for columns, count in self._iter_column_chunks(self._fetch_size or self._DEFAULT_FETCH_SIZE):
+            for index, chunk in enumerate(columns):
+                if encoded[index]:
+                    if isinstance(chunk, _EncodedColumn) and not chunk.dictionary.overflowed:
+                        packed[index].extend(-1 if code is None else code for code in chunk.codes)
+                        continue
+                    # The dictionary overflowed, decode the codes collected so far
+                    values = self._dictionaries[indexes[index]].values
+                    packed[index] = [values[code] if code >= 0 else None for code in packed[index]]
+                    encoded[index] = False
+                elif isinstance(packed[index], array.array) and None in chunk:
+                    # Arrays cannot hold NULL, keep this column as a list from now on
+                    packed[index] = packed[index].tolist()
+                packed[index].extend(chunk)
+            rows += count
+        result_columns = []
+        for i, column, is_encoded in zip(indexes, packed, encoded):
+            if is_encoded:
+                result_columns.append(('dictionary', column, self._dictionaries[i].values))
+            elif isinstance(column, array.array):
+                result_columns.append(('array', column))
+            else:
+                result_columns.append(('list', column))
+        return QueryResult(self.description, result_columns, rows, self._rowcount)
+
+
+# array.array typecode used to ship each integer java.sql.Types column between processes
+_ARRAY_TYPECODES = {
+    4: 'i',
+    -5: 'q',
+}
+
+
+class QueryResult(object):
+    """Result of a query run by :py:class:`ProcessPool`, held as packed columns.
+
+    Integer columns are ``array.array`` buffers and low cardinality string columns are an array of
+    dictionary codes plus the distinct values, so results cross process boundaries as a few compact
+    buffers instead of pickled rows.
+    """
+
+    def __init__(self, description, columns, row_count, rowcount=-1):
+        self.description = description
+        self.rowcount = rowcount
+        self._columns = columns
+        self._row_count = row_count
+
+    def __len__(self):
+        return self._row_count
+
+    def column(self, index):
+        """Return the values of column ``index`` as a sequence"""
+        packed = self._columns[index]
+        if packed[0] == 'dictionary':
+            _, codes, dictionary = packed
+            return [dictionary[code] if code >= 0 else None for code in codes]
+        return packed[1]
+
+    def columns(self):
+        return [self.column(i) for i in range(len(self._columns))]
+
+    def rows(self):
+        """Return the result as a list of tuples, like ``fetchall``"""
+        return list(zip(*self.columns()))
+
+
+# Connection of a ProcessPool worker, opened once per process by its first query
+_worker_connect = None
+_worker_connection = None
+
+
+def _init_worker(connect, connect_kwargs):
+    global _worker_connect
+    _worker_connect = functools.partial(connect, **connect_kwargs)
+
+
+def _run_worker_query(query):
+    global _worker_connection
+    if _worker_connection is None:
+        # Not in the initializer: a pool whose initializer fails respawns the worker forever,
+        # while an error here reaches the caller of map_queries
+        _worker_connection = _worker_connect()
+    operation, parameters = query
+    cursor = _worker_connection.cursor(stream_results=True, dictionary_encode=True)
+    try:
+        cursor.execute(operation, parameters)
+        return cursor._fetch_packed()
+    finally:
+        cursor.close()
+
+
+class ProcessPool(object):
+    """Runs queries in worker processes, each starting its own JVM and connection once.
+
+    Converting JDBC values to Python objects is CPU bound and holds the GIL, so a single process
+    cannot use more than one core for it. Workers ship results back as :py:class:`QueryResult`
+    objects of packed columns.
+
+    Requires Python 3.4 or later, for spawned worker processes.
+
+    :param processes: int -- number of worker processes, defaults to the number of CPUs
+    :param connect: function opening each worker's connection, called with ``connect_kwargs``;
+        defaults to :py:func:`connect` and must be defined at module level so that it can be
+        pickled
+    :param connect_kwargs: passed to ``connect`` in every worker
+    :raises: ``NotSupportedError`` on Python 2
+
+    .. note::
+        This is not a part of DB-API.
+    """
+
+    def __init__(self, processes=None, connect=connect, **connect_kwargs):
+        import multiprocessing
+        get_context = getattr(multiprocessing, 'get_context', None)
+        if get_context is None:
+            raise NotSupportedError("ProcessPool requires Python 3.4 or later")
+        # A forked child cannot use a JVM already started in the parent, so always spawn
+        context = get_context('spawn')
+        self._pool = context.Pool(processes, initializer=_init_worker,
+                                  initargs=(connect, connect_kwargs))
+
+    def map_queries(self, queries):
+        """Run ``queries`` across the workers.
+
+        :param queries: SQL strings, or ``(operation, parameters)`` tuples as for
+            :py:meth:`Cursor.execute`
+        :returns: list of :py:class:`QueryResult`, in the order of ``queries``
+        """
+        queries = [query if isinstance(query, tuple) else (query, None) for query in queries]
+        return self._pool.map(_run_worker_query, queries, chunksize=1)
+
+    def close(self):
+        """Wait for running queries and shut the workers down"""
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
 
-        self._state = self._STATE_FINISHED
 #
 # Type Objects and Constructors
 #
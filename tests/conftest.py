@@ -0,0 +1,33 @@
+"""Make the package importable as ``PySupersql`` when the tests run from a plain checkout, where the
+repository directory itself is the package.
+"""
+import os
+import sys
+import tempfile
+
+try:
+    import PySupersql  # noqa
+except ImportError:
+    _package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    _link_dir = tempfile.mkdtemp(prefix='pysupersql-tests-')
+    os.symlink(_package_dir, os.path.join(_link_dir, 'PySupersql'))
+    sys.path.insert(0, _link_dir)
+    # Subprocesses started by the tests need to find it too
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        [_link_dir] + [p for p in [os.environ.get('PYTHONPATH')] if p])
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """A fake coordinator that :py:func:`PySupersql.supersql.connect` connects to instead of
+    starting a JVM
+    """
+    import fakes
+    from PySupersql import supersql
+    fake = fakes.Server()
+    monkeypatch.setattr(supersql, '_open_jdbc_connection', fake.connect)
+    monkeypatch.setattr(supersql, '_attach_thread', lambda: None)
+    return fake
@@ -0,0 +1,189 @@
+"""Stand-ins for the JDBC objects that jpype hands to the DB-API module."""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import time
+
+INTEGER = 4
+VARCHAR = 12
+BIGINT = -5
+DOUBLE = 8
+TIMESTAMP = 93
+
+
+class SQLException(Exception):
+    """Like ``java.sql.SQLException`` as raised through jpype"""
+
+    def __init__(self, message, sql_state=None):
+        super(SQLException, self).__init__(message)
+        self._sql_state = sql_state
+
+    def getSQLState(self):
+        return self._sql_state
+
+
+class ResultSetMetaData(object):
+    def __init__(self, columns):
+        self._columns = columns
+
+    def getColumnCount(self):
+        return len(self._columns)
+
+    def getColumnName(self, i):
+        return self._columns[i - 1][0]
+
+    getColumnLabel = getColumnName
+
+    def getColumnType(self, i):
+        return self._columns[i - 1][1]
+
+
+class ResultSet(object):
+    def __init__(self, columns, rows):
+        self._columns = columns
+        self._rows = rows
+        self._position = -1
+        self._was_null = False
+        self.next_calls = 0
+
+    def getMetaData(self):
+        return ResultSetMetaData(self._columns)
+
+    def next(self):
+        self.next_calls += 1
+        self._position += 1
+        return self._position < len(self._rows)
+
+    def getString(self, i):
+        value = self._rows[self._position][i - 1]
+        self._was_null = value is None
+        return value
+
+    getDouble = getString
+
+    def getInt(self, i):
+        # Like JDBC, primitive getters return 0 for NULL
+        value = self.getString(i)
+        return 0 if value is None else value
+
+    getLong = getInt
+
+    def wasNull(self):
+        return self._was_null
+
+    def close(self):
+        pass
+
+
+class Statement(object):
+    def __init__(self, connection, sql=None):
+        self._connection = connection
+        self._sql = sql
+        self._result_set = None
+        self._update_count = -1
+        self.fetch_size = None
+
+    def setFetchSize(self, fetch_size):
+        self.fetch_size = fetch_size
+
+    def execute(self, sql):
+        server = self._connection.server
+        server.executed.append(sql)
+        if self._connection.busy:
+            raise AssertionError("JDBC connection used by two threads at once")
+        self._connection.busy = True
+        try:
+            if server.delay:
+                time.sleep(server.delay)
+        finally:
+            self._connection.busy = False
+        if server.error is not None:
+            raise server.error
+        if sql.lstrip().upper().startswith('INSERT'):
+            self._result_set = None
+            # One row per VALUES tuple
+            self._update_count = sql.count('), (') + 1
+            return False
+        self._result_set = ResultSet(server.columns, server.rows)
+        return True
+
+    def executeQuery(self, sql):
+        self.execute(sql)
+        return self._result_set
+
+    def getResultSet(self):
+        return self._result_set
+
+    def getUpdateCount(self):
+        return self._update_count
+
+    def getMetaData(self):
+        server = self._connection.server
+        if not server.prepared_metadata:
+            return None
+        return ResultSetMetaData(server.columns)
+
+    def close(self):
+        pass
+
+
+class Connection(object):
+    def __init__(self, server, host=None, port=None):
+        self.server = server
+        self.host = host
+        self.port = port
+        self.valid = True
+        self.closed = False
+        self.busy = False
+
+    def setSchema(self, schema):
+        pass
+
+    def createStatement(self):
+        return Statement(self)
+
+    def prepareStatement(self, sql):
+        if not self.server.supports_prepare:
+            raise SQLException("prepareStatement not supported", '0A000')
+        return Statement(self, sql)
+
+    def isValid(self, timeout):
+        return self.valid
+
+    def close(self):
+        self.closed = True
+
+
+class Server(object):
+    """A fake SuperSQL coordinator: the result every query returns and the SQL it was sent"""
+
+    def __init__(self, columns=None, rows=None, delay=0):
+        self.columns = columns if columns is not None else [('a', INTEGER), ('b', VARCHAR)]
+        self.rows = rows if rows is not None else []
+        self.delay = delay
+        self.error = None
+        self.prepared_metadata = True
+        self.supports_prepare = True
+        self.executed = []
+        self.connections = []
+
+    def connect(self, host=None, port=None):
+        connection = Connection(self, host, port)
+        self.connections.append(connection)
+        return connection
+
+
+def connect_worker(rows=None, refuse=False, **kwargs):
+    """Connect to a fresh fake server from a process of its own, e.g. a ProcessPool worker, where
+    the test's patches do not apply
+    """
+    from PySupersql import exc
+    from PySupersql import supersql
+    server = Server(rows=rows)
+
+    def open_connection(host, port):
+        if refuse:
+            raise exc.OperationalError("Connection refused: {}".format(host))
+        return server.connect(host, port)
+    supersql._open_jdbc_connection = open_connection
+    supersql._attach_thread = lambda: None
+    return supersql.connect(**kwargs)
@@ -0,0 +1,187 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from PySupersql import balancer
+from PySupersql import exc
+from PySupersql import supersql
+import fakes
+import pytest
+import time
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(balancer.time, 'time', clock)
+    return clock
+
+
+class Network(object):
+    """A connect factory for :py:class:`CoordinatorSet` over fake coordinators, some of which can
+    be taken down
+    """
+
+    def __init__(self):
+        self.server = fakes.Server()
+        self.down = set()
+        self.attempts = []
+
+    def connect(self, host, port):
+        self.attempts.append(host)
+        if host in self.down:
+            raise exc.OperationalError("Connection refused: {}".format(host))
+        return self.server.connect(host, port)
+
+
+def _wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+def _hosts(connections):
+    return sorted(connection.host for _, connection in connections)
+
+
+def test_least_outstanding_spreads_connections():
+    network = Network()
+    coordinators = balancer.CoordinatorSet([('a', 1), ('b', 1), ('c', 1)], network.connect)
+    connections = [coordinators.acquire() for _ in range(6)]
+    assert _hosts(connections) == ['a', 'a', 'b', 'b', 'c', 'c']
+
+
+def test_least_outstanding_prefers_idle_coordinator():
+    network = Network()
+    coordinators = balancer.CoordinatorSet([('a', 1), ('b', 1)], network.connect)
+    (first, _), (second, _) = coordinators.acquire(), coordinators.acquire()
+    with coordinators.track(first):
+        with coordinators.track(first):
+            busy = [c for c in coordinators.coordinators if c.outstanding]
+            assert busy == [first]
+            coordinator, connection = coordinators.acquire()
+    assert coordinator is second
+
+
+def test_ewma_prefers_faster_coordinator(clock):
+    network = Network()
+    coordinators = balancer.CoordinatorSet([('a', 1), ('b', 1)], network.connect,
+                                           policy=balancer.EWMA)
+    slow, fast = coordinators.coordinators
+    for coordinator, seconds in [(slow, 2.0), (fast, 0.1)]:
+        with coordinators.track(coordinator):
+            clock.now += seconds
+    assert slow.latency == pytest.approx(2.0)
+    for _ in range(5):
+        coordinator, _ = coordinators.acquire()
+        assert coordinator is fast
+    # The average moves towards new samples by the decay factor
+    with coordinators.track(fast):
+        clock.now += 1.1
+    assert fast.latency == pytest.approx(0.1 + 0.3 * 1.0)
+
+
+def test_failed_coordinator_is_ejected_and_reprobed(clock):
+    network = Network()
+    network.down.add('a')
+    coordinators = balancer.CoordinatorSet([('a', 1), ('b', 1)], network.connect,
+                                           eject_seconds=5)
+    a, b = coordinators.coordinators
+    for _ in range(4):
+        coordinator, _ = coordinators.acquire()
+        assert coordinator is b
+    assert not a.healthy
+    assert network.attempts.count('a') == 1
+
+    # Due for a reprobe: the query still goes to the healthy coordinator while a is probed in
+    # the background, and is ejected again for twice as long as it is still down
+    clock.now += 5
+    coordinator, _ = coordinators.acquire()
+    assert coordinator is b
+    _wait_for(lambda: a.ejections == 2)
+    assert network.attempts.count('a') == 2
+    assert a.ejected_until == clock.now + 10
+
+    # Back up: the reprobe puts it back in rotation with its connection ready for reuse
+    network.down.clear()
+    clock.now += 10
+    coordinator, _ = coordinators.acquire()
+    assert coordinator is b
+    _wait_for(lambda: a.healthy)
+    assert a.ejections == 0
+    coordinator, _ = coordinators.acquire()
+    assert coordinator is a
+    assert network.attempts.count('a') == 3
+
+
+def test_connection_errors_during_queries_eject():
+    network = Network()
+    coordinators = balancer.CoordinatorSet([('a', 1), ('b', 1)], network.connect)
+    coordinator, _ = coordinators.acquire()
+    with pytest.raises(exc.OperationalError):
+        with coordinators.track(coordinator):
+            raise exc.OperationalError("connection reset")
+    assert not coordinator.healthy
+    other = [c for c in coordinators.coordinators if c is not coordinator][0]
+    with pytest.raises(exc.ProgrammingError):
+        with coordinators.track(other):
+            raise exc.ProgrammingError("syntax error")
+    assert other.healthy
+
+
+def test_all_coordinators_down():
+    network = Network()
+    network.down.update(['a', 'b'])
+    coordinators = balancer.CoordinatorSet([('a', 1), ('b', 1)], network.connect)
+    with pytest.raises(exc.OperationalError):
+        coordinators.acquire()
+
+
+def test_idle_connections_are_pooled_per_coordinator():
+    network = Network()
+    coordinators = balancer.CoordinatorSet([('a', 1), ('b', 1)], network.connect, max_idle=1)
+    leases = [coordinators.acquire() for _ in range(4)]
+    for coordinator, connection in leases:
+        coordinators.release(coordinator, connection)
+    assert [len(c.idle) for c in coordinators.coordinators] == [1, 1]
+    assert sum(connection.closed for _, connection in leases) == 2
+
+    pooled = dict((c.host, c.idle[0]) for c in coordinators.coordinators)
+    coordinator, connection = coordinators.acquire()
+    assert connection is pooled[coordinator.host]
+    assert len(network.server.connections) == 4
+
+
+def test_stale_idle_connection_is_replaced():
+    network = Network()
+    coordinators = balancer.CoordinatorSet([('a', 1)], network.connect)
+    coordinator, connection = coordinators.acquire()
+    coordinators.release(coordinator, connection)
+    connection.valid = False
+    _, replacement = coordinators.acquire()
+    assert replacement is not connection
+    assert connection.closed
+
+
+def test_parse_addresses():
+    assert balancer.parse_addresses('a, b:7912,', 7911) == [('a', 7911), ('b', 7912)]
+    assert balancer.parse_addresses(['a', ('b', 1)], 7911) == [('a', 7911), ('b', 1)]
+
+
+def test_connect_with_hosts_only(server, monkeypatch):
+    monkeypatch.setattr(balancer, '_coordinator_sets', {})
+    server.rows = [(1, 'x')]
+    connection = supersql.connect(hosts=['a', 'b:2'])
+    cursor = connection.cursor()
+    cursor.execute('SELECT 1')
+    assert cursor.fetchall() == [(1, 'x')]
+    assert server.connections[0].host in ('a', 'b')
+    connection.close()
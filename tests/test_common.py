@@ -0,0 +1,142 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from PySupersql import common
+from PySupersql import exc
+import pytest
+import threading
+import time
+
+
+def _follow(flight, key, started, release):
+    """Start a leader call for ``key`` that blocks until ``release`` is set, and return a function
+    that makes a follower call and the leader's thread
+    """
+    results = {}
+
+    def leader():
+        def fn():
+            started.set()
+            release.wait()
+            if 'error' in results:
+                raise results['error']
+            return 'result'
+        try:
+            results['leader'] = flight.do(key, fn)
+        except Exception as e:
+            results['leader'] = e
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait()
+    return results, thread
+
+
+def test_followers_share_the_result():
+    flight = common.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    results, thread = _follow(flight, 'q', started, release)
+    follower = {}
+
+    def follow():
+        follower['result'] = flight.do('q', lambda: 'not run')
+    threads = [threading.Thread(target=follow) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while flight.stats()['coalesced'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in threads + [thread]:
+        t.join()
+    assert results['leader'] == 'result'
+    assert follower['result'] == 'result'
+    assert flight.stats() == {'executions': 1, 'coalesced': 3}
+
+
+def test_followers_get_their_own_exception():
+    flight = common.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    results, thread = _follow(flight, 'q', started, release)
+    results['error'] = exc.OperationalError("server went away")
+    errors = []
+
+    def follow():
+        try:
+            flight.do('q', lambda: 'not run')
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=follow) for _ in range(2)]
+    for t in threads:
+        t.start()
+    while flight.stats()['coalesced'] < 2:
+        time.sleep(0.001)
+    release.set()
+    for t in threads + [thread]:
+        t.join()
+    original = results['leader']
+    assert original is results['error']
+    assert len(errors) == 2 and errors[0] is not errors[1]
+    for error in errors:
+        assert error is not original
+        assert isinstance(error, exc.OperationalError)
+        assert error.args == original.args
+        assert error.__cause__ is original
+
+
+def test_keys_are_independent():
+    flight = common.SingleFlight()
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do('a', lambda: int('x'))
+    assert flight.stats() == {'executions': 3, 'coalesced': 0}
+
+
+class _PollingCursor(common.DBAPICursor):
+    """Finishes with one row after ``polls`` fetches that return nothing. ``batches`` fetches
+    returning a row each come first.
+    """
+
+    def __init__(self, polls, poll_interval, batches=0):
+        super(_PollingCursor, self).__init__(poll_interval)
+        self._polls = polls
+        self._batches = batches
+        self._state = self._STATE_RUNNING
+
+    @property
+    def description(self):
+        return None
+
+    def execute(self, operation, parameters=None):
+        raise NotImplementedError
+
+    def _fetch_more(self):
+        if self._batches:
+            self._batches -= 1
+            self._data.append([0])
+        elif self._polls:
+            self._polls -= 1
+        else:
+            self._data.append([1])
+            self._state = self._STATE_FINISHED
+
+
+def test_polling_backs_off_up_to_poll_interval(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(common.time, 'sleep', sleeps.append)
+    cursor = _PollingCursor(polls=6, poll_interval=0.01)
+    assert cursor.fetchone() == (1,)
+    assert sleeps == [0.001, 0.002, 0.004, 0.008, 0.01, 0.01]
+
+
+def test_wait_time_counts_time_spent_polling():
+    cursor = _PollingCursor(polls=3, poll_interval=0.01)
+    assert cursor.wait_time == 0
+    cursor.fetchall()
+    assert 0.006 <= cursor.wait_time < 1
+
+
+def test_polling_does_not_sleep_after_progress(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(common.time, 'sleep', sleeps.append)
+    cursor = _PollingCursor(polls=2, poll_interval=0.01, batches=3)
+    assert cursor.fetchall() == [(0,), (0,), (0,), (1,)]
+    assert sleeps == [0.001, 0.002]
@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from PySupersql import sqlalchemy_supersql
+from PySupersql import supersql
+from sqlalchemy.dialects import registry
+import fakes
+import pytest
+import sqlalchemy
+import time
+
+
+def test_keepalive_reconnects_stale_idle_connection(server):
+    connection = supersql.connect(host='localhost', keepalive_interval=0.01)
+    try:
+        stale = server.connections[0]
+        stale.valid = False
+        for _ in range(100):
+            if len(server.connections) > 1:
+                break
+            time.sleep(0.01)
+        assert stale.closed
+        assert connection.is_valid()
+    finally:
+        connection.close()
+
+
+def test_ping(server):
+    connection = supersql.connect(host='localhost')
+    connection.ping()
+    server.connections[0].valid = False
+    with pytest.raises(supersql.OperationalError):
+        connection.ping()
+    connection.ping(reconnect=True)
+    assert len(server.connections) == 2
+    connection.close()
+
+
+
+
+def test_warm_up(server):
+    server.rows = [(1, 'x')]
+    connection = supersql.connect(host='localhost', warm_up='true')
+    assert server.executed == ['SELECT 1']
+    connection.close()
+
+
+def test_lost_connection_raises_operational_error(server):
+    cursor = supersql.connect(host='localhost').cursor()
+    server.error = fakes.SQLException("Connection reset", '08S01')
+    with pytest.raises(supersql.OperationalError) as e:
+        cursor.execute('SELECT 1')
+    assert e.value.__cause__ is server.error
+    server.error = fakes.SQLException("Syntax error", '42000')
+    with pytest.raises(supersql.DatabaseError) as e:
+        cursor.execute('SELECT 1')
+    assert not isinstance(e.value, supersql.OperationalError)
+
+
+def test_dialect_do_ping_and_is_disconnect(server):
+    dialect = sqlalchemy_supersql.SupersqlDialect()
+    connection = supersql.connect(host='localhost')
+    assert dialect.do_ping(connection)
+    server.connections[0].valid = False
+    with pytest.raises(supersql.OperationalError) as e:
+        dialect.do_ping(connection)
+    assert dialect.is_disconnect(e.value, connection, None)
+    assert dialect.is_disconnect(fakes.SQLException("Connection reset", '08S01'), None, None)
+    assert not dialect.is_disconnect(supersql.DatabaseError("Syntax error"), None, None)
+    assert not dialect.is_disconnect(fakes.SQLException("Syntax error", '42000'), None, None)
+
+
+def test_engine_invalidates_connection_lost_mid_query(server):
+    registry.register('supersql', 'PySupersql.sqlalchemy_supersql', 'SupersqlDialect')
+    engine = sqlalchemy.create_engine('supersql://localhost:7911/default')
+    with engine.connect() as connection:
+        server.error = fakes.SQLException("Connection reset", '08S01')
+        with pytest.raises(sqlalchemy.exc.OperationalError) as e:
+            connection.execute(sqlalchemy.text('SELECT 1'))
+        assert e.value.connection_invalidated
+
+
+def test_engine_pre_ping_replaces_stale_connection(server):
+    registry.register('supersql', 'PySupersql.sqlalchemy_supersql', 'SupersqlDialect')
+    engine = sqlalchemy.create_engine('supersql://localhost:7911/default', pool_pre_ping=True)
+    server.rows = [(1, 'x')]
+    with engine.connect() as connection:
+        connection.execute(sqlalchemy.text('SELECT 1')).fetchall()
+    for jdbc_connection in server.connections:
+        jdbc_connection.valid = False
+    with engine.connect() as connection:
+        assert connection.execute(sqlalchemy.text('SELECT 1')).fetchall() == [(1, 'x')]
+    assert server.connections[-1].valid
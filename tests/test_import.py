@@ -0,0 +1,32 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import json
+import subprocess
+import sys
+
+# Seconds importing the DB-API module may take, excluding interpreter startup
+IMPORT_BUDGET = 0.1
+
+_SCRIPT = """
+import json, sys, time
+start = time.time()
+import PySupersql.supersql
+elapsed = time.time() - start
+heavy = ['jpype', 'requests', 'TCLIService', 'pyhive']
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in heavy if m in sys.modules]}))
+"""
+
+
+def _import_in_subprocess():
+    output = subprocess.check_output([sys.executable, '-c', _SCRIPT])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def test_import_does_not_load_heavy_dependencies():
+    assert _import_in_subprocess()['loaded'] == []
+
+
+def test_import_time_budget():
+    # Best of a few runs, to not fail on a momentarily busy machine
+    elapsed = min(_import_in_subprocess()['elapsed'] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET
@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from PySupersql import supersql
+from PySupersql import sqlalchemy_supersql
+from sqlalchemy import types
+from sqlalchemy.dialects import registry
+import fakes
+import pytest
+import sqlalchemy
+
+
+class _Connection(object):
+    """The parts of a SQLAlchemy connection the dialect's reflection uses"""
+
+    def __init__(self, dbapi_connection, describe_rows=()):
+        self.connection = dbapi_connection
+        self.describe_rows = describe_rows
+        self.executed = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+        return self
+
+    def fetchall(self):
+        return list(self.describe_rows)
+
+
+@pytest.fixture
+def dialect():
+    return sqlalchemy_supersql.SupersqlDialect()
+
+
+def test_get_columns_from_metadata(server, dialect):
+    server.columns = [('id', fakes.BIGINT), ('name', fakes.VARCHAR), ('price', fakes.DOUBLE),
+                      ('small', 5), ('flag', 16), ('code', 1), ('at', fakes.TIMESTAMP),
+                      ('day', 91), ('amount', 3)]
+    connection = _Connection(supersql.connect(host='localhost'))
+    columns = dialect.get_columns(connection, 't')
+    assert [(c['name'], c['type']) for c in columns] == [
+        ('id', types.BigInteger), ('name', types.String), ('price', types.Float),
+        ('small', types.Integer), ('flag', types.Boolean), ('code', types.String),
+        ('at', types.TIMESTAMP), ('day', types.DATE), ('amount', types.DECIMAL),
+    ]
+    assert connection.executed == []
+
+
+def test_get_columns_warns_on_unknown_type(server, dialect):
+    server.columns = [('id', fakes.INTEGER), ('shape', 424242)]
+    connection = _Connection(supersql.connect(host='localhost'))
+    with pytest.warns(Warning, match='shape'):
+        columns = dialect.get_columns(connection, 't')
+    assert columns[1]['type'] is types.NullType
+
+
+def test_get_columns_falls_back_to_describe(server, dialect):
+    server.supports_prepare = False
+    server.error = fakes.SQLException("Table 't' does not exist", '42S02')
+    connection = _Connection(supersql.connect(host='localhost'),
+                             describe_rows=[('id', 'int', ''), ('name', 'string', '')])
+    columns = dialect.get_columns(connection, 't')
+    assert [(c['name'], c['type']) for c in columns] == [
+        ('id', types.Integer), ('name', types.String)]
+    assert connection.executed == ['DESCRIBE "t"']
+
+
+def test_get_columns_does_not_hide_bugs(server, dialect, monkeypatch):
+    def broken(resultSetMetaData):
+        raise AttributeError('bug')
+    monkeypatch.setattr(supersql, '_describe', broken)
+    connection = _Connection(supersql.connect(host='localhost'))
+    with pytest.raises(AttributeError):
+        dialect.get_columns(connection, 't')
+
+
+def _insert_rows(url):
+    registry.register('supersql', 'PySupersql.sqlalchemy_supersql', 'SupersqlDialect')
+    engine = sqlalchemy.create_engine(url)
+    table = sqlalchemy.Table('t', sqlalchemy.MetaData(), sqlalchemy.Column('a', types.Integer),
+                             sqlalchemy.Column('b', types.String))
+    with engine.connect() as connection:
+        connection.execute(table.insert().values([
+            {'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}, {'a': 3, 'b': 'z'}]))
+
+
+def test_multi_values_insert_through_engine(server):
+    _insert_rows('supersql://localhost:7911/default')
+    assert server.executed == [
+        'INSERT INTO "t" ("a", "b") VALUES (1, \'x\'), (2, \'y\'), (3, \'z\')']
+
+
+def test_multi_values_insert_is_split_through_engine(server):
+    _insert_rows('supersql://localhost:7911/default?max_insert_parameters=4')
+    assert server.executed == [
+        'INSERT INTO "t" ("a", "b") VALUES (1, \'x\'), (2, \'y\')',
+        'INSERT INTO "t" ("a", "b") VALUES (3, \'z\')',
+    ]
@@ -0,0 +1,467 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from PySupersql import balancer
+from PySupersql import common
+from PySupersql import supersql
+import array
+import fakes
+import multiprocessing
+import pickle
+import pytest
+import sys
+import time
+
+
+def _cursor(server, **kwargs):
+    return supersql.Cursor('localhost', server.connect(), **kwargs)
+
+
+def test_fetch_buffers_result_by_default(server):
+    server.rows = [(i, 'x') for i in range(5)]
+    cursor = _cursor(server)
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor._data) == 5
+    assert cursor.fetchone() == (0, 'x')
+    assert cursor.fetchall() == [(i, 'x') for i in range(1, 5)]
+    assert cursor.fetchone() is None
+
+
+def test_stream_results_fetches_incrementally(server):
+    server.rows = [(i, 'x') for i in range(10)]
+    cursor = _cursor(server, stream_results=True, fetch_size=3)
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor._data) == 0
+    assert cursor.fetchmany(2) == [(0, 'x'), (1, 'x')]
+    assert len(cursor._data) == 1
+    assert len(cursor.fetchall()) == 8
+
+
+def test_stream_results_from_url_query_is_parsed(server):
+    server.rows = [(1, 'x')]
+    cursor = _cursor(server, stream_results='false')
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor._data) == 1
+    cursor = _cursor(server, stream_results='true')
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor._data) == 0
+
+
+def test_export_csv(server, tmpdir):
+    server.columns = [(b'id', fakes.INTEGER), ('name', fakes.VARCHAR)]
+    server.rows = [(1, 'a'), (2, 'b'), (3, 'c')]
+    cursor = _cursor(server, stream_results=True)
+    cursor.execute('SELECT * FROM t')
+    path = str(tmpdir.join('out.csv'))
+    result = cursor.export(path, row_group_size=2)
+    assert result['rows'] == 3
+    with open(path) as f:
+        assert f.read().splitlines() == ['id,name', '1,a', '2,b', '3,c']
+
+
+def test_export_refuses_unsupported_columns(server, tmpdir):
+    server.columns = [('id', fakes.INTEGER), ('price', fakes.DOUBLE)]
+    server.rows = [(1, 1.5)]
+    cursor = _cursor(server)
+    cursor.execute('SELECT * FROM t')
+    with pytest.raises(supersql.NotSupportedError) as e:
+        cursor.export(str(tmpdir.join('out.csv')))
+    assert 'price' in str(e.value)
+
+
+def test_description_uses_jdbc_type_names(server):
+    server.columns = [('a', fakes.INTEGER), ('b', fakes.VARCHAR), ('c', fakes.BIGINT),
+                      ('d', fakes.DOUBLE), ('e', fakes.TIMESTAMP), ('f', 424242)]
+    cursor = _cursor(server)
+    cursor.execute('SELECT * FROM t')
+    assert [column[:2] for column in cursor.description] == [
+        ('a', 'integer'), ('b', 'varchar'), ('c', 'bigint'), ('d', 'double'),
+        ('e', 'timestamp'), ('f', '424242'),
+    ]
+
+
+def test_describe_from_prepared_statement(server):
+    server.columns = [('a', fakes.INTEGER)]
+    cursor = _cursor(server)
+    assert cursor.describe('SELECT a FROM t')[0][:2] == ('a', 'integer')
+    assert server.executed == []
+
+
+def test_describe_falls_back_to_limit_0(server):
+    server.columns = [('a', fakes.INTEGER)]
+    server.supports_prepare = False
+    cursor = _cursor(server)
+    assert cursor.describe('SELECT a FROM t')[0][:2] == ('a', 'integer')
+    assert server.executed == ['SELECT * FROM (SELECT a FROM t) describe_query LIMIT 0']
+
+
+def test_describe_wraps_jdbc_errors(server):
+    server.supports_prepare = False
+    server.error = fakes.SQLException("Table 't' does not exist", '42S02')
+    cursor = _cursor(server)
+    with pytest.raises(supersql.DatabaseError):
+        cursor.describe('SELECT a FROM t')
+
+
+def test_single_flight_cursor_exports(server, tmpdir):
+    server.rows = [(1, 'a'), (2, 'b')]
+    connection = supersql.connect(host='localhost', single_flight=True)
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    assert cursor._columns is None
+    path = str(tmpdir.join('out.csv'))
+    assert cursor.export(path)['rows'] == 2
+    with open(path) as f:
+        assert f.read().splitlines() == ['a,b', '1,a', '2,b']
+
+
+def test_single_flight_cursor_refuses_unsupported_export(server, tmpdir):
+    server.columns = [('a', fakes.INTEGER), ('price', fakes.DOUBLE)]
+    server.rows = [(1, 1.5)]
+    connection = supersql.connect(host='localhost', single_flight=True)
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    with pytest.raises(supersql.NotSupportedError):
+        cursor.export(str(tmpdir.join('out.csv')))
+
+
+def test_single_flight_cursor_fetch_packed(server):
+    server.rows = [(1, 'a'), (2, None)]
+    connection = supersql.connect(host='localhost', single_flight=True)
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    result = cursor._fetch_packed()
+    assert len(result) == 2
+    assert list(result.rows()) == [(1, 'a'), (2, None)]
+
+
+class _JavaString(object):
+    """Like the java.lang.String proxies jpype returns without convertStrings"""
+
+    def __init__(self, value):
+        self._value = value
+
+    def __str__(self):
+        return self._value
+
+    def __reduce__(self):
+        raise TypeError("cannot pickle java.lang.String")
+
+
+def test_java_strings_are_converted(server, monkeypatch):
+    monkeypatch.setattr(supersql, '_strings_converted', False)
+    server.rows = [(1, _JavaString('a')), (2, None)]
+    for kwargs in ({}, {'dictionary_encode': True}):
+        cursor = _cursor(server, **kwargs)
+        cursor.execute('SELECT * FROM t')
+        rows = cursor.fetchall()
+        assert rows == [(1, 'a'), (2, None)]
+        assert type(rows[0][1]) is type('')
+    cursor = _cursor(server, stream_results=True)
+    cursor.execute('SELECT * FROM t')
+    result = cursor._fetch_packed()
+    assert pickle.loads(pickle.dumps(result)).rows() == [(1, 'a'), (2, None)]
+
+
+class _JPype(object):
+    """The parts of the jpype module :py:func:`supersql._start_jvm` uses"""
+
+    def __init__(self, supports_convert_strings):
+        self.started = None
+        self._supports_convert_strings = supports_convert_strings
+
+    def isJVMStarted(self):
+        return self.started is not None
+
+    def getDefaultJVMPath(self):
+        return '/jvm'
+
+    def startJVM(self, *args, **kwargs):
+        if kwargs and not self._supports_convert_strings:
+            raise TypeError("startJVM() got an unexpected keyword argument 'convertStrings'")
+        self.started = kwargs
+
+    def JClass(self, name):
+        pass
+
+
+@pytest.mark.parametrize('supports_convert_strings', [True, False])
+def test_jvm_is_started_converting_strings(monkeypatch, supports_convert_strings):
+    jpype = _JPype(supports_convert_strings)
+    monkeypatch.setitem(sys.modules, 'jpype', jpype)
+    monkeypatch.setattr(supersql, '_strings_converted', False)
+    assert supersql._start_jvm() is jpype
+    assert jpype.started == ({'convertStrings': True} if supports_convert_strings else {})
+    assert supersql._strings_converted
+
+
+def test_process_pool_requires_python_3(monkeypatch):
+    monkeypatch.delattr(multiprocessing, 'get_context', raising=False)
+    with pytest.raises(supersql.NotSupportedError):
+        supersql.ProcessPool()
+
+
+def test_streamed_fetchall_does_not_sleep_between_batches(server):
+    server.rows = [(i, 'x') for i in range(200)]
+    cursor = _cursor(server, stream_results=True, fetch_size=10)
+    cursor.execute('SELECT * FROM t')
+    start = time.time()
+    assert len(cursor.fetchall()) == 200
+    assert time.time() - start < 0.5
+
+
+def test_executemany_batches_inserts(server):
+    cursor = _cursor(server)
+    cursor.executemany('INSERT INTO t VALUES (%(a)s, %(b)s)',
+                       [{'a': i, 'b': 'v{}'.format(i)} for i in range(5)])
+    assert server.executed == [
+        "INSERT INTO t VALUES (0, 'v0'), (1, 'v1'), (2, 'v2'), (3, 'v3'), (4, 'v4')"
+    ]
+    assert cursor.rowcount == 5
+
+
+def test_executemany_splits_by_parameter_limit(server):
+    cursor = _cursor(server, max_insert_parameters=4)
+    cursor.executemany('INSERT INTO t VALUES (%(a)s, %(b)s)',
+                       [{'a': i, 'b': i} for i in range(5)])
+    assert server.executed == [
+        'INSERT INTO t VALUES (0, 0), (1, 1)',
+        'INSERT INTO t VALUES (2, 2), (3, 3)',
+        'INSERT INTO t VALUES (4, 4)',
+    ]
+    assert cursor.rowcount == 5
+
+
+def test_executemany_splits_by_statement_size(server):
+    prefix = 'INSERT INTO t VALUES '
+    cursor = _cursor(server, max_statement_size=len(prefix) + 2 * len('(10), '))
+    cursor.executemany(prefix + '(%s)', [(i,) for i in range(10, 15)])
+    assert server.executed == [
+        prefix + '(10), (11)',
+        prefix + '(12), (13)',
+        prefix + '(14)',
+    ]
+    assert cursor.rowcount == 5
+
+
+def test_executemany_runs_templates_with_literals_one_by_one(server):
+    cursor = _cursor(server)
+    cursor.executemany("INSERT INTO t VALUES (%(a)s, 'fixed')", [{'a': 1}, {'a': 2}])
+    assert server.executed == [
+        "INSERT INTO t VALUES (1, 'fixed')",
+        "INSERT INTO t VALUES (2, 'fixed')",
+    ]
+
+
+def test_multi_values_insert_is_split(server):
+    cursor = _cursor(server, max_insert_parameters=2)
+    cursor.execute('INSERT INTO t VALUES (%(a_0)s, %(b_0)s), (%(a_1)s, %(b_1)s)',
+                   {'a_0': 1, 'b_0': 'x', 'a_1': 2, 'b_1': 'y'})
+    assert server.executed == [
+        "INSERT INTO t VALUES (1, 'x')",
+        "INSERT INTO t VALUES (2, 'y')",
+    ]
+    assert cursor.rowcount == 2
+
+
+def test_split_values_rows():
+    assert supersql._split_values_rows('(%s, %s), (%s, %s)') == ['(%s, %s)', '(%s, %s)']
+    assert supersql._split_values_rows("(%s, 'a')") is None
+    assert supersql._split_values_rows('(%s), x') is None
+    assert supersql._split_values_rows('(%s') is None
+
+
+def test_null_integers(server):
+    server.columns = [('a', fakes.INTEGER), ('b', fakes.BIGINT), ('c', fakes.VARCHAR)]
+    server.rows = [(None, None, None), (0, 0, '')]
+    cursor = _cursor(server)
+    cursor.execute('SELECT * FROM t')
+    assert cursor.fetchall() == [(None, None, None), (0, 0, '')]
+
+
+def test_export_csv_writes_nulls_as_empty(server, tmpdir):
+    server.columns = [('a', fakes.INTEGER), ('b', fakes.VARCHAR)]
+    server.rows = [(None, 'x'), (0, None)]
+    cursor = _cursor(server, stream_results=True)
+    cursor.execute('SELECT * FROM t')
+    path = str(tmpdir.join('out.csv'))
+    cursor.export(path)
+    with open(path) as f:
+        assert f.read().splitlines() == ['a,b', ',x', '0,']
+
+
+def test_export_parquet(server, tmpdir):
+    pq = pytest.importorskip('pyarrow.parquet')
+    server.columns = [('id', fakes.INTEGER), ('total', fakes.BIGINT), ('name', fakes.VARCHAR)]
+    server.rows = [(1, 2 ** 40, 'a'), (None, None, None), (3, 0, 'c')]
+    cursor = _cursor(server, stream_results=True)
+    cursor.execute('SELECT * FROM t')
+    path = str(tmpdir.join('out.parquet'))
+    assert cursor.export(path, format='parquet', row_group_size=2)['rows'] == 3
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 2
+    table = parquet.read()
+    assert [str(field.type) for field in table.schema] == ['int32', 'int64', 'string']
+    assert table.to_pydict() == {
+        'id': [1, None, 3], 'total': [2 ** 40, None, 0], 'name': ['a', None, 'c']}
+
+
+def test_fetch_packed_keeps_null_integers(server):
+    server.columns = [('a', fakes.INTEGER), ('b', fakes.BIGINT)]
+    server.rows = [(1, 2), (3, 4), (None, 5)]
+    cursor = _cursor(server, stream_results=True, fetch_size=2)
+    cursor.execute('SELECT * FROM t')
+    result = cursor._fetch_packed()
+    assert result.rows() == [(1, 2), (3, 4), (None, 5)]
+    assert isinstance(result.column(1), array.array)
+
+
+def test_describe_does_not_hide_client_errors(server, monkeypatch):
+    def broken(resultSetMetaData):
+        raise AttributeError('bug')
+    monkeypatch.setattr(supersql, '_describe', broken)
+    cursor = _cursor(server)
+    with pytest.raises(AttributeError):
+        cursor.describe('SELECT a FROM t')
+    assert server.executed == []
+
+
+class _RecordingFlight(supersql.SingleFlight):
+    def __init__(self):
+        super(_RecordingFlight, self).__init__()
+        self.keys = []
+
+    def do(self, key, fn):
+        self.keys.append(key)
+        return super(_RecordingFlight, self).do(key, fn)
+
+
+def test_single_flight_is_per_server_and_schema():
+    flight = _RecordingFlight()
+    cursors = [
+        supersql.Cursor('a', fakes.Server().connect(), schema='s'),
+        supersql.Cursor('b', fakes.Server().connect(), schema='s'),
+        supersql.Cursor('a', fakes.Server().connect(), port=7912, schema='s'),
+        supersql.Cursor('a', fakes.Server().connect(), schema='t'),
+    ]
+    for cursor in cursors:
+        cursor._single_flight = flight
+        cursor.execute('SELECT * FROM t')
+    assert len(set(flight.keys)) == 4
+
+
+def test_single_flight_key_of_balanced_connection(server, monkeypatch):
+    monkeypatch.setattr(balancer, '_coordinator_sets', {})
+    flight = _RecordingFlight()
+    for hosts in (['a', 'b'], ['a', 'c']):
+        cursor = supersql.connect(hosts=hosts, single_flight=flight).cursor()
+        cursor.execute('SELECT * FROM t')
+    assert flight.keys[0] != flight.keys[1]
+
+
+def _distinct_strings(values):
+    """Equal values as separate string objects, like strings read from JDBC"""
+    return [None if value is None else ''.join(list(value)) for value in values]
+
+
+def test_dictionary_encode_interns_strings(server):
+    names = _distinct_strings(['alpha', 'beta', 'alpha', None, 'beta', 'alpha'])
+    assert names[0] is not names[2]
+    server.rows = [(i, name) for i, name in enumerate(names)]
+    cursor = _cursor(server, dictionary_encode=True)
+    cursor.execute('SELECT * FROM t')
+    values = [row[1] for row in cursor.fetchall()]
+    assert values == ['alpha', 'beta', 'alpha', None, 'beta', 'alpha']
+    assert values[0] is values[2] is values[5]
+    assert values[1] is values[4]
+
+
+def test_string_dictionary_overflow():
+    dictionary = supersql._StringDictionary(2)
+    assert [dictionary.encode(value) for value in ['a', 'b', 'a', None]] == [0, 1, 0, None]
+    assert dictionary.encode('c') == 'c'
+    assert dictionary.overflowed
+    # Once overflowed, values pass through even if they were encoded before
+    assert dictionary.encode('a') == 'a'
+    assert dictionary.values == ['a', 'b']
+
+
+def test_encoded_column_overflowing_partway():
+    dictionary = supersql._StringDictionary(2)
+    column = supersql._EncodedColumn(dictionary)
+    for value in ['a', 'b', None, 'c', 'a']:
+        column.codes.append(dictionary.encode(value))
+    assert column.codes == [0, 1, None, 'c', 'a']
+    assert list(column) == ['a', 'b', None, 'c', 'a']
+
+
+def test_fetch_packed_keeps_dictionary_codes(server):
+    server.rows = [(i, name) for i, name in enumerate(['x', 'y', 'x', None, 'y'])]
+    cursor = _cursor(server, stream_results=True, dictionary_encode=True, fetch_size=2)
+    cursor.execute('SELECT * FROM t')
+    result = cursor._fetch_packed()
+    kind, codes, values = result._columns[1]
+    assert kind == 'dictionary'
+    assert list(codes) == [0, 1, 0, -1, 1] and values == ['x', 'y']
+    assert result.column(1) == ['x', 'y', 'x', None, 'y']
+
+
+@pytest.mark.parametrize('fetch_size', [2, 3, 10])
+def test_fetch_packed_decodes_after_overflow(server, fetch_size):
+    names = ['a', 'b', 'a', None, 'c', 'd', 'a']
+    server.rows = [(i, name) for i, name in enumerate(names)]
+    cursor = _cursor(server, stream_results=True, dictionary_encode=True, max_dictionary_size=2,
+                     fetch_size=fetch_size)
+    cursor.execute('SELECT * FROM t')
+    result = cursor._fetch_packed()
+    assert result._columns[1][0] == 'list'
+    assert result.column(1) == names
+
+
+@pytest.mark.parametrize('max_dictionary_size', [None, 2])
+def test_export_parquet_dictionary_encoded(server, tmpdir, max_dictionary_size):
+    pq = pytest.importorskip('pyarrow.parquet')
+    pyarrow = pytest.importorskip('pyarrow')
+    names = ['a', 'b', 'a', None, 'a', 'c', 'b']
+    server.rows = [(i, name) for i, name in enumerate(names)]
+    cursor = _cursor(server, stream_results=True, dictionary_encode=True,
+                     max_dictionary_size=max_dictionary_size)
+    cursor.execute('SELECT * FROM t')
+    path = str(tmpdir.join('out.parquet'))
+    # The dictionary of size 2 overflows partway through the second row group
+    cursor.export(path, format='parquet', row_group_size=4)
+    table = pq.read_table(path)
+    column = table.column('b')
+    assert pyarrow.types.is_dictionary(column.type)
+    assert all(isinstance(chunk, pyarrow.DictionaryArray) for chunk in column.chunks)
+    assert column.to_pylist() == names
+    assert table.column('a').to_pylist() == list(range(7))
+
+
+def test_streamed_fetches_never_wait(server, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(common.time, 'sleep', sleeps.append)
+    server.rows = [(i, 'x') for i in range(50)]
+    cursor = _cursor(server, stream_results=True, fetch_size=10)
+    cursor.execute('SELECT * FROM t')
+    assert cursor.fetchone() == (0, 'x')
+    assert len(cursor.fetchmany(15)) == 15
+    assert len(cursor.fetchall()) == 34
+    assert sleeps == []
+    assert cursor.wait_time == 0
+
+
+def test_process_pool_map_queries():
+    rows = [(1, 'a'), (None, 'b'), (3, 'a')]
+    with supersql.ProcessPool(2, connect=fakes.connect_worker, rows=rows, host='localhost') as pool:
+        results = pool.map_queries(['SELECT * FROM t', ('SELECT * FROM t WHERE a = %s', (1,))])
+    assert [result.rows() for result in results] == [rows, rows]
+    assert [column[0] for column in results[0].description] == ['a', 'b']
+
+
+def test_process_pool_reports_connect_errors():
+    pool = supersql.ProcessPool(1, connect=fakes.connect_worker, refuse=True, host='localhost')
+    try:
+        with pytest.raises(supersql.OperationalError):
+            pool.map_queries(['SELECT 1'])
+    finally:
+        pool.terminate()
@@ -0,0 +1,94 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from PySupersql import supersql
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def _run_threads(threads, target):
+    workers = [threading.Thread(target=target) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def _run_queries(connection, threads, queries_per_thread):
+    """Run queries from ``threads`` threads sharing ``connection`` and return the elapsed time"""
+    errors = []
+
+    def work():
+        try:
+            cursor = connection.cursor()
+            for _ in range(queries_per_thread):
+                cursor.execute('SELECT * FROM t')
+                assert cursor.fetchall() == [(1, 'x')]
+            cursor.close()
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+    start = time.time()
+    _run_threads(threads, work)
+    assert errors == []
+    return time.time() - start
+
+
+def test_throughput_scales_with_threads(server):
+    """Queries waiting on the server do not hold the GIL or a shared JDBC connection, so threads
+    sharing a connection run them concurrently
+    """
+    server.rows = [(1, 'x')]
+    server.delay = 0.02
+    connection = supersql.connect(host='localhost')
+    queries = 16
+    timings = {}
+    for threads in (1, 2, 4, 8):
+        timings[threads] = _run_queries(connection, threads, queries // threads)
+    assert timings[4] < timings[1] / 2
+    assert timings[8] < timings[2]
+
+
+def test_threads_sharing_a_connection_use_separate_jdbc_connections(server):
+    server.rows = [(1, 'x')]
+    server.delay = 0.02
+    connection = supersql.connect(host='localhost')
+    _run_queries(connection, 4, 5)
+    # The fake raises when two threads use one JDBC connection at the same time
+    assert 1 < len(server.connections) <= 4
+
+
+def test_jdbc_connections_are_reused_across_threads(server):
+    """Like a SQLAlchemy QueuePool: many short lived workers borrow a few connections in turn"""
+    server.rows = [(1, 'x')]
+    pool = queue.Queue()
+    for _ in range(3):
+        pool.put(supersql.connect(host='localhost'))
+
+    def work():
+        connection = pool.get()
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT * FROM t')
+            cursor.fetchall()
+            cursor.close()
+        finally:
+            pool.put(connection)
+    for _ in range(5):
+        _run_threads(10, work)
+    assert len(server.connections) == 3
+
+
+def test_cursors_of_one_thread_share_a_jdbc_connection(server):
+    server.rows = [(1, 'x')]
+    connection = supersql.connect(host='localhost')
+    first, second = connection.cursor(), connection.cursor()
+    first.execute('SELECT * FROM t')
+    second.execute('SELECT * FROM t')
+    assert len(server.connections) == 1
+    first.close()
+    second.close()
+    assert connection._free == connection._slots